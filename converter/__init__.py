@@ -20,7 +20,8 @@ class Converter:
     def enex_to_markdown(cls, 
                          source: Union[str, Path],
                          target: Union[str, Path],
-                         converter_type: str = 'soup') -> None:
+                         converter_type: str = 'soup',
+                         workers: Optional[int] = None) -> None:
         """
         将ENEX文件转换为Markdown文件
         
@@ -28,6 +29,7 @@ class Converter:
             source: ENEX文件路径
             target: 输出目录路径
             converter_type: HTML转换器类型 ('soup' 或 'html2text')
+            workers: 并行转换的进程数，默认使用 Config.MAX_WORKERS（串行）
         """
         try:
             source_path = Path(source)
@@ -40,26 +42,27 @@ class Converter:
                 raise ValueError(f"不是ENEX文件: {source_path}")
             
             # 解析
-            logger.info(f"开始解析: {source_path}")
+            logger.info("开始解析: %s", source_path)
             parser = EnexParser(source_path)
             notes = parser.parse()
             
             # 写入
-            logger.info(f"开始写入Markdown文件")
-            writer = MarkdownWriter(target_path, converter_type)
-            writer.write_all(notes)
+            logger.info("开始写入Markdown文件")
+            writer = MarkdownWriter(target_path, converter_type, workers)
+            count = writer.write_all(notes)
             
-            logger.info(f"转换完成: {len(notes)} 个笔记")
+            logger.info("转换完成: %s 个笔记", count)
             
         except Exception as e:
-            logger.error(f"转换失败: {e}")
+            logger.error("转换失败: %s", e)
             raise
     
     @classmethod
     def markdown_to_enex(cls,
                         source: Union[str, Path],
                         target: Union[str, Path],
-                        resource_paths: Optional[List[Union[str, Path]]] = None) -> None:
+                        resource_paths: Optional[List[Union[str, Path]]] = None,
+                        workers: Optional[int] = None) -> None:
         """
         将Markdown文件转换为ENEX格式
         
@@ -67,6 +70,7 @@ class Converter:
             source: Markdown文件目录
             target: ENEX输出文件路径
             resource_paths: 额外的资源搜索路径
+            workers: 并行解析的进程数，默认使用 Config.MAX_WORKERS（串行）
         """
         try:
             source_path = Path(source)
@@ -87,23 +91,16 @@ class Converter:
             if not md_files:
                 raise ValueError(f"未找到Markdown文件: {source_path}")
             
-            logger.info(f"找到 {len(md_files)} 个Markdown文件")
+            logger.info("找到 %s 个Markdown文件", len(md_files))
             
-            for md_file in md_files:
-                try:
-                    parser = MarkdownParser(md_file, res_paths)
-                    note = parser.parse()
-                    if note:
-                        writer.write(note)
-                except Exception as e:
-                    logger.warning(f"处理失败 {md_file.name}: {e}")
+            # 并行解析，按文件顺序写入
+            notes = MarkdownParser.parse_many(md_files, res_paths, workers)
+            count = writer.write_all(notes)
             
-            # 保存
-            writer.save()
-            logger.info(f"转换完成")
+            logger.info("转换完成: %s 个笔记", count)
             
         except Exception as e:
-            logger.error(f"转换失败: {e}")
+            logger.error("转换失败: %s", e)
             raise
     
     @classmethod
@@ -11,9 +11,17 @@ class Config:
     # 资源配置
     ASSETS_DIR_NAME = 'assets'
     DEFAULT_RESOURCE_DIRS = ['assets', 'images', 'attachments']
+    HASH_CHUNK_SIZE = 1 << 20  # 计算文件哈希时每次读取的字节数
+    BASE64_CHUNK_SIZE = 57 * 1024 * 16  # 流式base64编码的块大小，必须是3的倍数
+    WRITE_BUFFER_SIZE = 1 << 20  # 流式写入ENEX文件的缓冲区大小
     
-    # HTML转换配置
-    HTML_PARSER = 'xml'  # 'xml' 或 'html.parser'
+    # 转换缓存配置
+    MARKDOWN_CACHE_SIZE = 0     # 进程内缓存的条目数，0 表示不缓存
+    MARKDOWN_CACHE_DIR = None   # 设置目录后启用磁盘缓存，如 '.enex-cache'
+    
+    # 并行配置
+    MAX_WORKERS = 1     # 并行转换的进程数，1 表示串行（默认），None 表示使用全部CPU核心
+    IO_WORKERS = 4      # 写入附件的线程数
     
     # Markdown配置
     MARKDOWN_EXTENSIONS = [
@@ -2,21 +2,32 @@
 from dataclasses import dataclass, field
 from typing import List, Optional
 from datetime import datetime
+from pathlib import Path
 
 @dataclass
 class Resource:
     """笔记资源/附件"""
     mime: str
-    data: bytes
+    data: Optional[bytes]
     hash: str
     file_name: Optional[str] = None
     size: Optional[int] = None
     width: Optional[int] = None
     height: Optional[int] = None
+    path: Optional[Path] = None  # 数据未载入时的来源文件
     
     def __post_init__(self):
-        if self.size is None and self.data:
-            self.size = len(self.data)
+        if self.size is None:
+            if self.data:
+                self.size = len(self.data)
+            elif self.path is not None:
+                self.size = self.path.stat().st_size
+    
+    def read_data(self) -> bytes:
+        """获取资源数据（未载入时从来源文件读取）"""
+        if self.data is None and self.path is not None:
+            return self.path.read_bytes()
+        return self.data or b''
 
 @dataclass
 class Note:
@@ -1,7 +1,7 @@
 """解析器基类"""
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Union
+from typing import Iterator, List, Union
 from ..models import Note
 
 class BaseParser(ABC):
@@ -17,6 +17,6 @@ class BaseParser(ABC):
             raise FileNotFoundError(f"源文件不存在: {self.source}")
     
     @abstractmethod
-    def parse(self) -> Union[Note, List[Note]]:
+    def parse(self) -> Union[Note, List[Note], Iterator[Note]]:
         """解析文件"""
         pass
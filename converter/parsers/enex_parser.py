@@ -1,34 +1,67 @@
 """ENEX格式解析器"""
-import base64
-import xml.etree.ElementTree as ET
-from typing import List, Optional
+from typing import Iterator, Optional
 from .base import BaseParser
 from ..models import Note, Resource
 from ..utils.logger import get_logger
 from ..utils.helpers import calculate_hash, parse_timestamp
 
+try:
+    from lxml import etree as ET
+    # 资源的base64文本可能很长，需要关闭libxml2的长度限制；
+    # 与标准库一样不展开外部实体，也不访问网络（lxml 5.0之前默认会展开外部实体）
+    _ITERPARSE_OPTIONS = {
+        'huge_tree': True,
+        'remove_blank_text': True,
+        'resolve_entities': 'internal' if ET.LXML_VERSION >= (5,) else False,
+        'no_network': True,
+    }
+    
+    def _release(elem) -> None:
+        """释放已处理的笔记元素及其之前的兄弟节点"""
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+except ImportError:  # 未安装lxml时回退到标准库
+    import xml.etree.ElementTree as ET
+    _ITERPARSE_OPTIONS = {}
+    
+    def _release(elem) -> None:
+        """释放已处理的笔记元素（标准库元素不支持访问兄弟节点）"""
+        elem.clear()
+
+try:
+    import pybase64 as base64  # 可选，基于SIMD的快速解码
+except ImportError:
+    import base64
+
 logger = get_logger()
 
 class EnexParser(BaseParser):
     """ENEX文件解析器"""
     
-    def parse(self) -> List[Note]:
-        """解析ENEX文件并返回笔记列表"""
+    def parse(self) -> Iterator[Note]:
+        """
+        流式解析ENEX文件，逐个返回笔记
+        
+        每个笔记解析完成后立即释放对应元素，内存占用只与单个笔记相关
+        """
+        count = 0
         try:
-            tree = ET.parse(self.source)
-            root = tree.getroot()
-            notes = []
-            
-            for note_elem in root.findall('note'):
-                note = self._parse_note(note_elem)
+            for _, elem in ET.iterparse(str(self.source), events=('end',),
+                                        **_ITERPARSE_OPTIONS):
+                if elem.tag != 'note':
+                    continue
+                
+                note = self._parse_note(elem)
+                _release(elem)
                 if note:
-                    notes.append(note)
+                    count += 1
+                    yield note
             
-            logger.info(f"成功解析 {len(notes)} 个笔记")
-            return notes
+            logger.info("成功解析 %s 个笔记", count)
             
         except ET.ParseError as e:
-            logger.error(f"ENEX文件解析失败: {e}")
+            logger.error("ENEX文件解析失败: %s", e)
             raise ValueError(f"无效的ENEX文件: {e}")
     
     def _parse_note(self, elem: ET.Element) -> Optional[Note]:
@@ -58,7 +91,7 @@ class EnexParser(BaseParser):
             return note
             
         except Exception as e:
-            logger.error(f"笔记解析失败: {e}")
+            logger.error("笔记解析失败: %s", e)
             return None
     
     def _parse_resource(self, elem: ET.Element) -> Optional[Resource]:
@@ -68,7 +101,9 @@ class EnexParser(BaseParser):
             if data_elem is None or not data_elem.text:
                 return None
             
-            data = base64.b64decode(data_elem.text)
+            # 不做字符校验以走最快路径，解码后立即释放base64文本
+            data = base64.b64decode(data_elem.text, validate=False)
+            data_elem.text = None
             hash_value = data_elem.get('hash') or calculate_hash(data)
             
             # 获取属性
@@ -85,7 +120,7 @@ class EnexParser(BaseParser):
             )
             
         except Exception as e:
-            logger.warning(f"资源解析失败: {e}")
+            logger.warning("资源解析失败: %s", e)
             return None
     
     @staticmethod
@@ -1,7 +1,11 @@
 """Markdown格式解析器"""
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from html import unescape
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import frontmatter
 from markdown import Markdown
 from PIL import Image
@@ -10,42 +14,71 @@ from .base import BaseParser
 from ..models import Note, Resource
 from ..utils.logger import get_logger
 from ..utils.helpers import (
-    parse_timestamp, calculate_hash, 
-    guess_extension, find_file
+    parse_timestamp, calculate_file_hash, 
+    guess_mime, find_file, read_image_size
 )
 from ..config import Config
-from ..processors.table_handler import TableHandler
 
 logger = get_logger()
 
+# HTML图片标签: <img ... src="xxx" ...>
+_IMG_TAG_RE = re.compile(r'<img\b[^>]*?\bsrc="([^"]*)"[^>]*>')
+# Markdown图片语法: ![alt](path)，只捕获路径
+_MD_IMAGE_RE = re.compile(r'!\[[^\]]*\]\(([^)]+)\)')
+# Markdown文件链接: [text](path)
+_MD_LINK_RE = re.compile(r'(?<!!)\[([^\]]+)\]\(([^)]+)\)')
+
+# 配置Markdown解析器，包含表格扩展（导入时创建一次，每次转换前重置）
+_MARKDOWN = Markdown(extensions=[
+    'extra',
+    'tables',  # 表格支持
+    'fenced_code',
+    'nl2br',
+    'attr_list',  # 属性列表
+    'def_list',   # 定义列表
+])
+
+@lru_cache(maxsize=256)
+def _resource_dirs(base: Path, extra: Tuple[Path, ...]) -> Tuple[Path, ...]:
+    """资源搜索路径，同一目录下的文件共用一份"""
+    return (
+        base,
+        *(base / dir_name for dir_name in Config.DEFAULT_RESOURCE_DIRS),
+        *extra,
+    )
+
+# 子进程内各文件共用的目录索引（进程池随每次批量解析创建，不会跨批次保留）
+_worker_dir_index: Dict[Path, Set[str]] = {}
+
+def _parse_file(source: Path, resource_paths: List[Path],
+                dir_index: Optional[Dict[Path, Set[str]]] = None) -> Optional[Note]:
+    """解析单个Markdown文件（可在子进程中执行，未传入目录索引时使用子进程的索引）"""
+    if dir_index is None:
+        dir_index = _worker_dir_index
+    try:
+        return MarkdownParser(source, resource_paths, dir_index).parse()
+    except Exception as e:
+        logger.warning("处理失败 %s: %s", source.name, e)
+        return None
+
 class MarkdownParser(BaseParser):
     """Markdown文件解析器"""
     
-    def __init__(self, source: Path, resource_paths: List[Path] = None):
+    def __init__(self, source: Path, resource_paths: List[Path] = None,
+                 dir_index: Optional[Dict[Path, Set[str]]] = None):
         super().__init__(source)
         self.resource_paths = self._init_resource_paths(resource_paths)
-        self.table_handler = TableHandler()
-        
-        # 配置Markdown解析器，包含表格扩展
-        self.html_converter = Markdown(extensions=[
-            'extra',
-            'tables',  # 表格支持
-            'fenced_code',
-            'nl2br',
-            'attr_list',  # 属性列表
-            'def_list',   # 定义列表
-        ])
+        # 资源目录的文件名索引，批量解析时由parse_many传入，同一批次的文件共用
+        self._dir_index = dir_index if dir_index is not None else {}
+        self._resource_cache: Dict[Path, Resource] = {}  # 已加载的资源文件
+        self._find_cache: Dict[str, Optional[Path]] = {}  # 引用路径的查找结果
+        
+        # 共用模块级的Markdown解析器，避免每个文件重复加载扩展
+        self.html_converter = _MARKDOWN
     
-    def _init_resource_paths(self, paths: List[Path] = None) -> List[Path]:
+    def _init_resource_paths(self, paths: List[Path] = None) -> Tuple[Path, ...]:
         """初始化资源搜索路径"""
-        base_paths = [self.source.parent]
-        for dir_name in Config.DEFAULT_RESOURCE_DIRS:
-            base_paths.append(self.source.parent / dir_name)
-        
-        if paths:
-            base_paths.extend(paths)
-        
-        return base_paths
+        return _resource_dirs(self.source.parent, tuple(paths or ()))
     
     def parse(self) -> Optional[Note]:
         """解析Markdown文件"""
@@ -58,7 +91,7 @@ class MarkdownParser(BaseParser):
             processed_content = self._preprocess_markdown(post.content)
             
             # 转换为HTML
-            html_content = self.html_converter.convert(processed_content)
+            html_content = self.html_converter.reset().convert(processed_content)
             
             # 创建笔记
             metadata = post.metadata
@@ -77,17 +110,43 @@ class MarkdownParser(BaseParser):
             resources = self._parse_resources(post.content)
             for resource in resources:
                 note.add_resource(resource)
-                # 替换HTML中的引用
-                note.content = self._replace_resource_ref(
-                    note.content, resource
-                )
+            
+            # 一次替换HTML中的所有引用
+            if resources:
+                note.content = self._replace_resource_refs(note.content, resources)
             
             return note
             
         except Exception as e:
-            logger.error(f"Markdown解析失败 {self.source}: {e}")
+            logger.error("Markdown解析失败 %s: %s", self.source, e)
             return None
     
+    @classmethod
+    def parse_many(cls, sources: Iterable[Path],
+                   resource_paths: List[Path] = None,
+                   workers: Optional[int] = None) -> Iterator[Note]:
+        """
+        批量解析Markdown文件，按输入顺序逐个返回成功解析的笔记
+        
+        多个文件在进程池中并行解析，workers为1时在当前进程中串行执行
+        """
+        workers = workers or Config.MAX_WORKERS or os.cpu_count() or 1
+        resource_paths = resource_paths or []
+        
+        if workers <= 1:
+            dir_index: Dict[Path, Set[str]] = {}
+            notes = (_parse_file(source, resource_paths, dir_index) for source in sources)
+            yield from filter(None, notes)
+            return
+        
+        sources = list(sources)
+        # 按文件数分块，每个进程大约分到4块，文件较少时也能用上所有进程
+        chunksize = max(1, len(sources) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            notes = executor.map(_parse_file, sources,
+                                 [resource_paths] * len(sources), chunksize=chunksize)
+            yield from filter(None, notes)
+    
     def _preprocess_markdown(self, content: str) -> str:
         """
         预处理Markdown内容
@@ -134,94 +193,141 @@ class MarkdownParser(BaseParser):
         return tags if isinstance(tags, list) else []
     
     def _parse_resources(self, content: str) -> List[Resource]:
-        """解析资源"""
-        resources = []
+        """
+        解析资源（同一文件只保留一个资源）
         
-        # 匹配Markdown图片语法: ![alt](path)
-        img_pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
+        先在当前线程中查找所有引用的文件（只查目录索引），
+        再在线程池中并行读取新文件的哈希和图片尺寸
+        """
+        # 图片和文件链接都包含"]("，没有时无需运行正则
+        if '](' not in content:
+            return []
         
-        for match in re.finditer(img_pattern, content):
-            file_path = match.group(2)
-            # 跳过URL
-            if file_path.startswith(('http://', 'https://', 'data:')):
-                continue
-            
-            resource = self._load_resource(file_path)
-            if resource:
-                resources.append(resource)
+        # 引用的文件及是否来自图片语法
+        refs: List[Tuple[Path, bool]] = []
         
-        # 匹配文件链接: [text](path)
-        link_pattern = r'(?<!!)\[([^\]]+)\]\(([^)]+)\)'
+        # 匹配Markdown图片语法（先做字面量检查，没有图片时不运行正则）
+        if '![' in content:
+            for match in _MD_IMAGE_RE.finditer(content):
+                file_path = match.group(1)
+                # 跳过URL
+                if file_path.startswith(('http://', 'https://', 'data:')):
+                    continue
+                
+                full_path = self._find_resource_file(file_path)
+                if full_path:
+                    refs.append((full_path, True))
         
-        for match in re.finditer(link_pattern, content):
+        # 匹配文件链接
+        for match in _MD_LINK_RE.finditer(content):
             file_path = match.group(2)
             # 跳过URL和锚点
             if file_path.startswith(('http://', 'https://', '#', 'mailto:')):
                 continue
             
             # 尝试作为本地文件资源
-            resource = self._load_resource(file_path)
-            if resource and not resource.mime.startswith('image/'):
-                resources.append(resource)
+            full_path = self._find_resource_file(file_path)
+            if full_path:
+                refs.append((full_path, False))
         
-        return resources
+        # 同一文件被多次引用时只加载一次
+        pending = [path for path in dict.fromkeys(path for path, _ in refs)
+                   if path not in self._resource_cache]
+        if len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=Config.IO_WORKERS) as executor:
+                loaded = list(executor.map(self._load_resource, pending))
+        else:
+            loaded = [self._load_resource(path) for path in pending]
+        for path, resource in zip(pending, loaded):
+            if resource:
+                self._resource_cache[path] = resource
+        
+        resources: Dict[Path, Resource] = {}
+        for path, is_image in refs:
+            resource = self._resource_cache.get(path)
+            # 文件链接只接收非图片资源
+            if resource and (is_image or not resource.mime.startswith('image/')):
+                resources.setdefault(path, resource)
+        
+        return list(resources.values())
     
-    def _load_resource(self, file_path: str) -> Optional[Resource]:
-        """加载资源文件"""
+    def _load_resource(self, full_path: Path) -> Optional[Resource]:
+        """加载资源文件（不修改解析器状态，可在线程池中执行）"""
         try:
-            # 查找文件
-            full_path = find_file(file_path, self.resource_paths)
-            if not full_path:
-                logger.warning(f"资源文件未找到: {file_path}")
-                return None
-            
-            # 读取数据
-            with open(full_path, 'rb') as f:
-                data = f.read()
+            # 分块计算哈希，数据在写出时才从文件读取
+            file_hash = calculate_file_hash(full_path)
             
             # 获取MIME类型
-            import mimetypes
-            mime_type = mimetypes.guess_type(str(full_path))[0]
-            mime_type = mime_type or 'application/octet-stream'
+            mime_type = guess_mime(full_path.suffix)
             
             # 获取图片尺寸
             width, height = None, None
             if mime_type.startswith('image/'):
-                try:
-                    with Image.open(full_path) as img:
-                        width, height = img.size
-                except Exception:
-                    pass
+                width, height = self._image_size(full_path)
             
             return Resource(
                 mime=mime_type,
-                data=data,
-                hash=calculate_hash(data),
+                data=None,
+                hash=file_hash,
                 file_name=full_path.name,
                 width=width,
-                height=height
+                height=height,
+                path=full_path
             )
             
         except Exception as e:
-            logger.warning(f"加载资源失败 {file_path}: {e}")
+            logger.warning("加载资源失败 %s: %s", full_path, e)
             return None
     
-    def _replace_resource_ref(self, html: str, resource: Resource) -> str:
+    def _find_resource_file(self, file_path: str) -> Optional[Path]:
+        """查找资源文件，同一引用路径（包括找不到的）只查找一次"""
+        if file_path not in self._find_cache:
+            full_path = find_file(file_path, self.resource_paths, self._dir_index)
+            if not full_path:
+                logger.warning("资源文件未找到: %s", file_path)
+            self._find_cache[file_path] = full_path
+        return self._find_cache[file_path]
+    
+    @staticmethod
+    def _image_size(path: Path) -> Tuple[Optional[int], Optional[int]]:
+        """获取图片尺寸，常见格式只读文件头，其他格式交给PIL"""
+        try:
+            size = read_image_size(path)
+            if size is None:
+                with Image.open(path) as img:
+                    size = img.size
+            return size
+        except Exception:
+            return None, None
+    
+    def _replace_resource_refs(self, html: str, resources: List[Resource]) -> str:
         """替换HTML中的资源引用为ENEX媒体标签"""
-        from bs4 import BeautifulSoup
-        
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        for img in soup.find_all('img'):
-            src = img.get('src', '')
-            if resource.file_name and resource.file_name in src:
-                media = soup.new_tag('en-media')
-                media['type'] = resource.mime
-                media['hash'] = resource.hash
-                if resource.width:
-                    media['width'] = str(resource.width)
-                if resource.height:
-                    media['height'] = str(resource.height)
-                img.replace_with(media)
-        
-        return str(soup)
\ No newline at end of file
+        if '<img' not in html:
+            return html
+        
+        # 按文件名索引资源，同名时保留第一个
+        by_name: Dict[str, Resource] = {}
+        for resource in resources:
+            if resource.file_name:
+                by_name.setdefault(resource.file_name, resource)
+        if not by_name:
+            return html
+        
+        def replace(match: re.Match) -> str:
+            src = unescape(match.group(1))
+            resource = by_name.get(src.replace('\\', '/').rsplit('/', 1)[-1])
+            if resource is None:
+                return match.group(0)
+            return self._create_media_tag(resource)
+        
+        # 一次扫描完成所有img标签的替换，无需构建文档树
+        return _IMG_TAG_RE.sub(replace, html)
+    
+    def _create_media_tag(self, resource: Resource) -> str:
+        """创建ENEX媒体标签"""
+        attrs = f'type="{resource.mime}" hash="{resource.hash}"'
+        if resource.width:
+            attrs += f' width="{resource.width}"'
+        if resource.height:
+            attrs += f' height="{resource.height}"'
+        return f'<en-media {attrs}></en-media>'
@@ -1,24 +1,67 @@
 """HTML转换处理器"""
-from bs4 import BeautifulSoup, NavigableString, Comment, Doctype, Declaration
-from html2text import HTML2Text
+from lxml import etree
+import os
 import re
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
 
+from ..config import Config
 from ..utils.logger import get_logger
+from ..utils.helpers import calculate_hash
 from .table_handler import TableHandler
+from .html_tree import Element, parse_html, is_tag, iter_children, get_text
+
+if TYPE_CHECKING:
+    from html2text import HTML2Text
 
 logger = get_logger()
 
+# Markdown清理规则
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+_AUTOLINK_RE = re.compile(r'<(https?://[^>]+)>')
+_LIST_START_RE = re.compile(r'([^\n])\n(\d+\.|-|\*) ')
+
+# 引用块: 空白行（连同换行符）和每行行首
+_BLANK_LINE_RE = re.compile(r'^[^\S\n]*(?:\n|\Z)', re.MULTILINE)
+_LINE_START_RE = re.compile(r'^', re.MULTILINE)
+
+# 标题标签对应的级别
+_HEADING_LEVELS = {f'h{level}': level for level in range(1, 7)}
+
+# 可直接作为class名称出现的代码语言
+_CODE_LANGUAGES = frozenset({'python', 'javascript', 'java', 'cpp', 'c', 'bash', 'sql'})
+
+@lru_cache(maxsize=None)
+def _cache_fingerprint(converter_type: str) -> str:
+    """
+    磁盘缓存的版本指纹
+    
+    由转换代码（本目录下的模块）和解析库的版本计算，升级后旧的缓存自动失效
+    """
+    parts = [converter_type.encode('utf-8'), repr(etree.LXML_VERSION).encode('ascii')]
+    if converter_type == 'html2text':
+        import html2text
+        parts.append(repr(html2text.__version__).encode('ascii'))
+    for path in sorted(Path(__file__).parent.glob('*.py')):
+        parts.append(path.read_bytes())
+    return calculate_hash(b'\0'.join(parts), 'sha1')[:16]
+
 class HtmlToMarkdownConverter:
     """HTML到Markdown转换器"""
     
     def __init__(self, converter_type: str = 'soup'):
         self.converter_type = converter_type
         self.table_handler = TableHandler()  # 使用专门的表格处理器
+        self._cache: Dict[str, str] = {}
         if converter_type == 'html2text':
             self.html2text = self._setup_html2text()
     
-    def _setup_html2text(self) -> HTML2Text:
-        """配置html2text转换器"""
+    def _setup_html2text(self) -> 'HTML2Text':
+        """配置html2text转换器（只在使用时才导入html2text）"""
+        from html2text import HTML2Text
+        
         converter = HTML2Text()
         converter.body_width = 0
         converter.ignore_links = False
@@ -33,144 +76,264 @@ class HtmlToMarkdownConverter:
         return converter
     
     def convert(self, html: str) -> str:
-        """转换HTML到Markdown"""
+        """转换HTML到Markdown（启用缓存时按内容哈希缓存结果）"""
+        # 默认不缓存，也不计算哈希
+        if not Config.MARKDOWN_CACHE_SIZE and not Config.MARKDOWN_CACHE_DIR:
+            return self._convert(html)
+        
+        key = calculate_hash(html.encode('utf-8'), 'sha1')
+        
+        markdown = self._cache.get(key)
+        if markdown is None:
+            markdown = self._read_cache(key)
+        if markdown is None:
+            markdown = self._convert(html)
+            self._write_cache(key, markdown)
+        
+        # 进程内缓存，超出容量时淘汰最早的条目
+        if Config.MARKDOWN_CACHE_SIZE and key not in self._cache:
+            if len(self._cache) >= Config.MARKDOWN_CACHE_SIZE:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = markdown
+        return markdown
+    
+    def _convert(self, html: str) -> str:
+        """按转换器类型转换"""
         if self.converter_type == 'html2text':
             return self._convert_with_html2text(html)
-        else:
-            return self._convert_with_soup(html)
+        return self._convert_with_soup(html)
+    
+    def _cache_path(self, key: str) -> Optional[Path]:
+        """磁盘缓存文件路径（未启用时返回None），路径中包含版本指纹"""
+        if not Config.MARKDOWN_CACHE_DIR:
+            return None
+        fingerprint = _cache_fingerprint(self.converter_type)
+        return (Path(Config.MARKDOWN_CACHE_DIR) / self.converter_type / fingerprint
+                / key[:2] / f"{key[2:]}.md")
+    
+    def _read_cache(self, key: str) -> Optional[str]:
+        """读取磁盘缓存"""
+        path = self._cache_path(key)
+        if path is None or not path.is_file():
+            return None
+        try:
+            return path.read_bytes().decode('utf-8')
+        except OSError as e:
+            logger.warning("读取转换缓存失败 %s: %s", path, e)
+            return None
+    
+    def _write_cache(self, key: str, markdown: str) -> None:
+        """写入磁盘缓存"""
+        path = self._cache_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写入同目录下的临时文件再替换，其他进程不会读到写了一半的缓存
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(markdown.encode('utf-8'))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning("写入转换缓存失败 %s: %s", path, e)
     
     def _convert_with_html2text(self, html: str) -> str:
         """使用html2text转换"""
-        soup = BeautifulSoup(html, 'xml')
+        # 始终先经过lxml解析：html2text会把字符引用转换为ASCII近似字符
+        # （如&#233;变成e），对不规范的标签的处理也与lxml不同
+        root = parse_html(html)
+        if root is None:
+            return ''
         
         # 预处理表格 - 使用新的表格处理器
-        for table in soup.find_all('table'):
+        for table in list(root.iter('table')):
             markdown_table = self.table_handler.html_table_to_markdown(table)
-            table.replace_with(soup.new_string(f"\n{markdown_table}\n"))
+            self._replace_with_text(table, f"\n{markdown_table}\n")
         
         # 转换HTML到Markdown
-        markdown = self.html2text.handle(str(soup))
+        markdown = self.html2text.handle(
+            etree.tostring(root, encoding='unicode', method='html')
+        )
         
         # 清理格式
         return self._clean_markdown(markdown)
     
+    @staticmethod
+    def _replace_with_text(elem: Element, text: str) -> None:
+        """用文本替换元素（文本并入前一个兄弟节点的尾部或父元素的文本）"""
+        parent = elem.getparent()
+        if parent is None:
+            return
+        text += elem.tail or ''
+        previous = elem.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + text
+        else:
+            parent.text = (parent.text or '') + text
+        parent.remove(elem)
+    
     def _convert_with_soup(self, html: str) -> str:
-        """使用BeautifulSoup转换"""
-        soup = BeautifulSoup(html, 'xml')
-        markdown = self._process_elements(soup)
+        """逐个元素转换（converter_type='soup'）"""
+        root = parse_html(html)
+        if root is None:
+            return ''
+        markdown = self._process_elements(root)
         return self._clean_markdown(markdown)
     
     def _process_elements(self, element) -> str:
-        """递归处理HTML元素"""
-        lines = []
+        """
+        处理HTML元素的子节点
+        
+        使用显式栈代替递归遍历，按标签名查表分派处理函数：
+        叶子标签直接生成Markdown，容器标签在子节点处理完后包装其内容。
+        所有片段写入同一个列表，只在需要包装时合并该元素的片段，
+        其他标签的内容原样保留，最后整体拼接一次
+        """
+        out: List[str] = []
+        # 栈帧: (子节点迭代器, 该元素片段的起始位置, 当前元素, 包装函数)
+        stack = [(iter_children(element), 0, None, None)]
         
-        for child in element.children:
-            # 跳过特殊节点
-            if isinstance(child, (Comment, Doctype, Declaration)):
+        while stack:
+            children, start, node, wrap = stack[-1]
+            child = next(children, None)
+            
+            # 子节点处理完毕
+            if child is None:
+                stack.pop()
+                if node is None:
+                    continue
+                if wrap is not None:
+                    content = ''.join(out[start:])
+                    del out[start:]
+                    out.append(wrap(self, node, content))
+                elif not any(piece.strip() for piece in out[start:]):
+                    # 其他标签: 内容只有空白时丢弃
+                    del out[start:]
                 continue
-
+            
             # 文本节点
-            if isinstance(child, NavigableString):
-                text = str(child).strip()
+            if isinstance(child, str):
+                text = child.strip()
                 if text:
-                    lines.append(text)
+                    out.append(text)
                 continue
             
-            # 标题
-            if child.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                content = self._process_elements(child)
-                level = int(child.name[1])
-                lines.append(f"\n{'#' * level} {content}\n")
-            
-            # 段落和div
-            elif child.name in ['p', 'div']:
-                content = self._process_elements(child)
-                if content.strip():
-                    lines.append(f"{content}\n")
-            
-            # 换行
-            elif child.name == 'br':
-                lines.append('\n')
-            
-            # 列表
-            elif child.name in ['ul', 'ol']:
-                lines.append(self._convert_list(child))
-            
-            # 表格 - 使用新的表格处理器
-            elif child.name == 'table':
-                table_md = self.table_handler.html_table_to_markdown(child)
-                lines.append(f"\n{table_md}\n")
-            
-            # 图片
-            elif child.name == 'img':
-                src = child.get('src', '')
-                alt = child.get('alt', 'image')
-                lines.append(f"![{alt}]({src})")
-            
-            # 链接
-            elif child.name == 'a':
-                href = child.get('href', '')
-                text = self._process_elements(child)
-                if href:
-                    lines.append(f"[{text}]({href})")
-                else:
-                    lines.append(text)
-            
-            # 加粗
-            elif child.name in ['strong', 'b']:
-                content = self._process_elements(child)
-                lines.append(f"**{content}**")
-            
-            # 斜体
-            elif child.name in ['em', 'i']:
-                content = self._process_elements(child)
-                lines.append(f"*{content}*")
-            
-            # 代码
-            elif child.name == 'code':
-                content = self._process_elements(child)
-                lines.append(f"`{content}`")
-            
-            # 代码块
-            elif child.name == 'pre':
-                code = child.find('code')
-                if code:
-                    content = code.get_text()
-                    lang = self._detect_code_language(code)
-                    lines.append(f"\n```{lang}\n{content}\n```\n")
-                else:
-                    content = child.get_text()
-                    lines.append(f"\n```\n{content}\n```\n")
-            
-            # 引用
-            elif child.name == 'blockquote':
-                content = self._process_elements(child)
-                quoted = '\n'.join(f"> {line}" for line in content.split('\n') if line.strip())
-                lines.append(f"\n{quoted}\n")
-            
-            # 水平线
-            elif child.name == 'hr':
-                lines.append('\n---\n')
+            # 跳过注释、处理指令等特殊节点
+            if not is_tag(child):
+                continue
             
-            # 其他标签
+            emit = self._LEAF_HANDLERS.get(child.tag)
+            if emit is not None:
+                out.append(emit(self, child))
             else:
-                content = self._process_elements(child)
-                if content.strip():
-                    lines.append(content)
+                wrap_child = self._WRAP_HANDLERS.get(child.tag)
+                stack.append((iter_children(child), len(out), child, wrap_child))
         
-        return ''.join(lines)
+        return ''.join(out)
+    
+    # 叶子标签: 直接由元素生成Markdown
+    
+    def _emit_br(self, elem) -> str:
+        """换行"""
+        return '\n'
+    
+    def _emit_list(self, elem) -> str:
+        """列表"""
+        return self._convert_list(elem)
+    
+    def _emit_table(self, elem) -> str:
+        """表格 - 使用新的表格处理器"""
+        table_md = self.table_handler.html_table_to_markdown(elem)
+        return f"\n{table_md}\n"
+    
+    def _emit_img(self, elem) -> str:
+        """图片"""
+        src = elem.get('src', '')
+        alt = elem.get('alt', 'image')
+        return f"![{alt}]({src})"
+    
+    def _emit_pre(self, elem) -> str:
+        """代码块"""
+        code = elem.find('.//code')
+        if code is not None:
+            content = get_text(code)
+            lang = self._detect_code_language(code)
+            return f"\n```{lang}\n{content}\n```\n"
+        content = get_text(elem)
+        return f"\n```\n{content}\n```\n"
+    
+    def _emit_hr(self, elem) -> str:
+        """水平线"""
+        return '\n---\n'
+    
+    # 容器标签: 用子节点生成的内容包装出Markdown
+    
+    def _wrap_heading(self, elem, content: str) -> str:
+        """标题"""
+        return f"\n{'#' * _HEADING_LEVELS[elem.tag]} {content}\n"
+    
+    def _wrap_block(self, elem, content: str) -> str:
+        """段落和div"""
+        return f"{content}\n" if content.strip() else ''
+    
+    def _wrap_link(self, elem, content: str) -> str:
+        """链接"""
+        href = elem.get('href', '')
+        return f"[{content}]({href})" if href else content
+    
+    def _wrap_strong(self, elem, content: str) -> str:
+        """加粗"""
+        return f"**{content}**"
+    
+    def _wrap_em(self, elem, content: str) -> str:
+        """斜体"""
+        return f"*{content}*"
+    
+    def _wrap_code(self, elem, content: str) -> str:
+        """代码"""
+        return f"`{content}`"
+    
+    def _wrap_blockquote(self, elem, content: str) -> str:
+        """引用"""
+        # 去掉空白行后给每行加上引用前缀
+        lines = _BLANK_LINE_RE.sub('', content).rstrip('\n')
+        quoted = _LINE_START_RE.sub('> ', lines) if lines else ''
+        return f"\n{quoted}\n"
+    
+    _LEAF_HANDLERS = {
+        'br': _emit_br,
+        'ul': _emit_list, 'ol': _emit_list,
+        'table': _emit_table,
+        'img': _emit_img,
+        'pre': _emit_pre,
+        'hr': _emit_hr,
+    }
+    
+    _WRAP_HANDLERS = {
+        **dict.fromkeys(_HEADING_LEVELS, _wrap_heading),
+        'p': _wrap_block, 'div': _wrap_block,
+        'a': _wrap_link,
+        'strong': _wrap_strong, 'b': _wrap_strong,
+        'em': _wrap_em, 'i': _wrap_em,
+        'code': _wrap_code,
+        'blockquote': _wrap_blockquote,
+    }
     
     def _convert_list(self, list_elem) -> str:
         """转换列表"""
         lines = []
-        items = list_elem.find_all('li', recursive=False)
+        items = [child for child in list_elem if child.tag == 'li']
         
         for i, item in enumerate(items):
             content = self._process_elements(item).strip()
             # 处理嵌套列表
             content_lines = content.split('\n')
             
-            if list_elem.name == 'ol':
+            if list_elem.tag == 'ol':
                 lines.append(f"{i + 1}. {content_lines[0]}")
             else:
                 lines.append(f"- {content_lines[0]}")
@@ -184,27 +347,29 @@ class HtmlToMarkdownConverter:
     
     def _detect_code_language(self, code_elem) -> str:
         """检测代码语言"""
-        # 检查class属性
-        classes = code_elem.get('class', [])
-        for cls in classes:
-            if cls.startswith('language-'):
-                return cls.replace('language-', '')
-            elif cls in ['python', 'javascript', 'java', 'cpp', 'c', 'bash', 'sql']:
+        # 检查class属性（大多数代码元素没有class）
+        classes = code_elem.get('class')
+        if not classes:
+            return ''
+        for cls in classes.split():
+            if cls[:9] == 'language-':
+                return cls[9:]
+            elif cls in _CODE_LANGUAGES:
                 return cls
         return ''
     
     def _clean_markdown(self, content: str) -> str:
         """清理Markdown内容"""
         # 清理多余空行
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+        content = _BLANK_LINES_RE.sub('\n\n', content)
         
         # 修复链接
-        content = re.sub(r'<(https?://[^>]+)>', r'[\1](\1)', content)
+        content = _AUTOLINK_RE.sub(r'[\1](\1)', content)
         
         # 清理转义（但保留表格中的转义管道符）
         # content = re.sub(r'\\([#\-*_.>])', r'\1', content)
         
         # 确保列表和其他块级元素前后有空行
-        content = re.sub(r'([^\n])\n(\d+\.|-|\*) ', r'\1\n\n\2 ', content)
+        content = _LIST_START_RE.sub(r'\1\n\n\2 ', content)
         
         return content.strip()
\ No newline at end of file
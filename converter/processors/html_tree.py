@@ -0,0 +1,32 @@
+"""基于lxml的HTML文档树工具"""
+from typing import Iterator, Optional, Union
+from lxml import etree
+
+Element = etree._Element
+
+def parse_html(html: str) -> Optional[Element]:
+    """
+    解析HTML，返回根元素（内容为空时返回None）
+
+    使用feed接口解析，ENML开头带encoding声明的字符串也能直接处理
+    """
+    parser = etree.HTMLParser()
+    parser.feed(html)
+    return parser.close()
+
+def is_tag(node) -> bool:
+    """是否为普通标签（注释、处理指令等的tag不是字符串）"""
+    return isinstance(node.tag, str)
+
+def iter_children(elem: Element) -> Iterator[Union[str, Element]]:
+    """按文档顺序遍历子节点，文本以字符串形式给出"""
+    if elem.text:
+        yield elem.text
+    for child in elem:
+        yield child
+        if child.tail:
+            yield child.tail
+
+def get_text(elem: Element) -> str:
+    """获取元素内的全部文本（不含注释）"""
+    return ''.join(elem.itertext())
@@ -1,15 +1,48 @@
 """表格处理模块"""
 from typing import List, Dict, Optional, Tuple
-from bs4 import BeautifulSoup, Tag, NavigableString
+from lxml import etree, html as lxml_html
+import sys
 from dataclasses import dataclass
+from functools import lru_cache
+from xml.sax.saxutils import escape
 import re
 
 from ..utils.logger import get_logger
+from .html_tree import Element, is_tag, iter_children, get_text
 
 logger = get_logger()
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_CELL_SPACE_RE = re.compile(r'(?:\s|<br>)+')
+_SEPARATOR_CELL_RE = re.compile(r'^:?-+:?$')
 
-@dataclass
+# 单元格内的Markdown行内格式
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+_ITALIC_RE = re.compile(r'\*(.+?)\*')
+_CODE_RE = re.compile(r'`(.+?)`')
+_LINK_RE = re.compile(r'\[(.+?)\]\((.+?)\)')
+
+# HTML单元格内的标签对应的Markdown格式
+_CELL_FORMATS = {
+    'strong': '**{}**', 'b': '**{}**',
+    'em': '*{}*', 'i': '*{}*',
+    'code': '`{}`',
+}
+_ALIGNMENTS = frozenset({'left', 'center', 'right'})
+_SEPARATOR_CELLS = {'center': ':---:', 'right': '---:'}
+
+# 表格中间结构使用__slots__，减少大表格中每个单元格的内存（Python 3.10+）
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@lru_cache(maxsize=256)
+def _separator_row(alignments: Tuple[str, ...]) -> str:
+    """按各列对齐方式生成Markdown表格的分隔符行"""
+    separators = [_SEPARATOR_CELLS.get(align, '---') for align in alignments]
+    return '| ' + ' | '.join(separators) + ' |'
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class TableCell:
     """表格单元格"""
     content: str
@@ -22,20 +55,24 @@ class TableCell:
         self.content = self.content.strip()
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class TableRow:
     """表格行"""
     cells: List[TableCell]
     is_header: bool = False
 
 
+@dataclass(**_DATACLASS_OPTIONS)
+class NormalizedTable:
+    """展开合并单元格后的表格，按行分别存放单元格内容和表头标记"""
+    contents: List[List[str]]
+    header_rows: List[bool]
+
+
 class TableHandler:
     """表格处理器"""
     
-    def __init__(self):
-        self.logger = get_logger()
-    
-    def html_table_to_markdown(self, table: Tag) -> str:
+    def html_table_to_markdown(self, table: Element) -> str:
         """
         将HTML表格转换为Markdown格式
         
@@ -52,54 +89,46 @@ class TableHandler:
                 return ''
             
             # 处理合并单元格
-            normalized_rows = self._normalize_merged_cells(rows)
+            normalized = self._normalize_merged_cells(rows)
             
             # 检测列对齐
-            alignments = self._detect_column_alignment(table, len(normalized_rows[0].cells))
+            alignments = self._detect_column_alignment(table, len(normalized.contents[0]))
             
             # 生成Markdown表格
-            return self._generate_markdown_table(normalized_rows, alignments)
+            return self._generate_markdown_table(normalized, alignments)
             
         except Exception as e:
-            logger.warning(f"表格转换失败: {e}")
+            logger.warning("表格转换失败: %s", e)
             return self._fallback_table_conversion(table)
     
-    def _parse_table_structure(self, table: Tag) -> List[TableRow]:
-        """解析表格结构"""
+    def _parse_table_structure(self, table: Element) -> List[TableRow]:
+        """解析表格结构（只遍历一次表格的直接子元素）"""
         rows = []
         
-        # 处理thead中的行（表头）
-        thead = table.find('thead')
-        if thead:
-            for tr in thead.find_all('tr', recursive=False):
-                row = self._parse_row(tr, is_header=True)
-                if row:
-                    rows.append(row)
-        
-        # 处理tbody中的行（表体）
-        tbody = table.find('tbody')
-        if tbody:
-            for tr in tbody.find_all('tr', recursive=False):
-                row = self._parse_row(tr, is_header=False)
-                if row:
-                    rows.append(row)
-        
-        # 如果没有thead/tbody，直接处理tr
-        if not rows:
-            for tr in table.find_all('tr', recursive=False):
-                row = self._parse_row(tr, is_header=False)
+        for child in table:
+            # 没有thead/tbody包裹的行
+            if child.tag == 'tr':
+                row = self._parse_row(child, is_header=False)
                 if row:
                     rows.append(row)
+            
+            # thead中的行为表头，tbody中的行为表体
+            elif child.tag in ('thead', 'tbody'):
+                is_header = child.tag == 'thead'
+                for tr in child.iterchildren('tr'):
+                    row = self._parse_row(tr, is_header=is_header)
+                    if row:
+                        rows.append(row)
         
         return rows
     
-    def _parse_row(self, tr: Tag, is_header: bool = False) -> Optional[TableRow]:
+    def _parse_row(self, tr: Element, is_header: bool = False) -> Optional[TableRow]:
         """解析表格行"""
         cells = []
         
-        for cell in tr.find_all(['td', 'th'], recursive=False):
+        for cell in tr.iterchildren('td', 'th'):
             # 如果是th标签，强制设为表头
-            cell_is_header = is_header or cell.name == 'th'
+            cell_is_header = is_header or cell.tag == 'th'
             
             # 获取单元格内容（保留格式）
             content = self._get_cell_content(cell)
@@ -124,55 +153,53 @@ class TableHandler:
         
         return TableRow(cells=cells, is_header=is_header)
     
-    def _get_cell_content(self, cell: Tag) -> str:
+    def _get_cell_content(self, cell: Element) -> str:
         """获取单元格内容（保留内部格式）"""
+        # 纯文本单元格（最常见的情况）直接取文本，不逐个遍历子节点
+        if len(cell) == 0:
+            return self._clean_cell_text(cell.text or '')
+        
         # 处理单元格内的HTML格式
         content_parts = []
         
-        for element in cell.children:
-            if isinstance(element, NavigableString):
-                text = str(element).strip()
+        for element in iter_children(cell):
+            if isinstance(element, str):
+                text = element.strip()
                 if text:
                     content_parts.append(text)
-            elif element.name == 'br':
+                continue
+            
+            if not is_tag(element):
+                continue
+            tag = element.tag
+            if tag == 'br':
                 content_parts.append('<br>')
-            elif element.name in ['strong', 'b']:
-                text = element.get_text().strip()
-                if text:
-                    content_parts.append(f'**{text}**')
-            elif element.name in ['em', 'i']:
-                text = element.get_text().strip()
-                if text:
-                    content_parts.append(f'*{text}*')
-            elif element.name == 'code':
-                text = element.get_text().strip()
-                if text:
-                    content_parts.append(f'`{text}`')
-            elif element.name == 'a':
+                continue
+            
+            text = get_text(element).strip()
+            if not text:
+                continue
+            if tag == 'a':
                 href = element.get('href', '')
-                text = element.get_text().strip()
-                if text and href:
-                    content_parts.append(f'[{text}]({href})')
-                elif text:
-                    content_parts.append(text)
+                content_parts.append(f'[{text}]({href})' if href else text)
             else:
-                text = element.get_text().strip()
-                if text:
-                    content_parts.append(text)
+                # 按标签查表包装，其他标签只保留文本
+                content_parts.append(_CELL_FORMATS.get(tag, '{}').format(text))
         
-        content = ' '.join(content_parts)
-        # 替换<br>为空格（Markdown表格不支持换行）
-        content = content.replace('<br>', ' ')
-        # 清理多余空格
-        content = re.sub(r'\s+', ' ', content)
+        return self._clean_cell_text(' '.join(content_parts))
+    
+    def _clean_cell_text(self, content: str) -> str:
+        """整理单元格文本"""
+        # <br>替换为空格（Markdown表格不支持换行），同时合并多余空格
+        content = _CELL_SPACE_RE.sub(' ', content)
         
         return content.strip() or ' '
     
-    def _get_cell_alignment(self, cell: Tag) -> Optional[str]:
+    def _get_cell_alignment(self, cell: Element) -> Optional[str]:
         """获取单元格对齐方式"""
         # 检查align属性
         align = cell.get('align', '').lower()
-        if align in ['left', 'center', 'right']:
+        if align in _ALIGNMENTS:
             return align
         
         # 检查style属性
@@ -187,17 +214,28 @@ class TableHandler:
         
         return None
     
-    def _normalize_merged_cells(self, rows: List[TableRow]) -> List[TableRow]:
+    def _normalize_merged_cells(self, rows: List[TableRow]) -> NormalizedTable:
         """
         处理合并单元格
-        将合并的单元格展开为多个单元格（内容相同）
+        将合并的单元格展开为多个单元格（内容相同），只保留生成表格所需的内容
         """
         if not rows:
-            return rows
+            return NormalizedTable([], [])
+        
+        header_rows = [row.is_header for row in rows]
         
         # 确定最大列数
         max_cols = max(sum(cell.colspan for cell in row.cells) for row in rows)
         
+        # 没有合并单元格时（最常见的情况）无需构建网格，只补齐缺少的列
+        if all(cell.rowspan == 1 and cell.colspan == 1
+               for row in rows for cell in row.cells):
+            contents = [
+                [cell.content for cell in row.cells] + [''] * (max_cols - len(row.cells))
+                for row in rows
+            ]
+            return NormalizedTable(contents, header_rows)
+        
         # 创建二维网格来追踪单元格占用
         grid = [[None for _ in range(max_cols)] for _ in range(len(rows))]
         
@@ -219,42 +257,33 @@ class TableHandler:
                 
                 col_idx += cell.colspan
         
-        # 从网格重建行
-        normalized_rows = []
-        for row_idx, row in enumerate(rows):
+        # 从网格读取各行内容
+        contents = []
+        for grid_row in grid:
             cells = []
             seen_cells = set()
             
-            for col_idx in range(max_cols):
-                cell = grid[row_idx][col_idx]
-                if cell and id(cell) not in seen_cells:
-                    # 对于合并单元格，创建展开的副本
-                    for _ in range(cell.colspan):
-                        cells.append(TableCell(
-                            content=cell.content,
-                            is_header=cell.is_header,
-                            align=cell.align
-                        ))
+            for cell in grid_row:
+                if cell is None:
+                    cells.append('')
+                elif id(cell) not in seen_cells:
+                    # 对于合并单元格，重复其内容
+                    cells.extend([cell.content] * cell.colspan)
                     seen_cells.add(id(cell))
-                elif not cell:
-                    cells.append(TableCell(content=' '))
             
             # 只保留实际需要的列数
-            normalized_rows.append(TableRow(
-                cells=cells[:max_cols],
-                is_header=row.is_header
-            ))
+            contents.append(cells[:max_cols])
         
-        return normalized_rows
+        return NormalizedTable(contents, header_rows)
     
-    def _detect_column_alignment(self, table: Tag, num_cols: int) -> List[str]:
+    def _detect_column_alignment(self, table: Element, num_cols: int) -> List[str]:
         """检测每列的对齐方式"""
         alignments = ['left'] * num_cols
         
         # 检查colgroup
-        colgroup = table.find('colgroup')
-        if colgroup:
-            cols = colgroup.find_all('col')
+        colgroup = table.find('.//colgroup')
+        if colgroup is not None:
+            cols = colgroup.findall('.//col')
             for idx, col in enumerate(cols[:num_cols]):
                 align = self._get_cell_alignment(col)
                 if align:
@@ -262,69 +291,55 @@ class TableHandler:
         
         return alignments
     
-    def _generate_markdown_table(self, rows: List[TableRow], 
+    def _generate_markdown_table(self, table: NormalizedTable, 
                                  alignments: List[str]) -> str:
         """生成Markdown表格"""
-        if not rows:
+        contents = table.contents
+        if not contents:
             return ''
         
-        lines = []
-        
-        # 确定是否有表头
-        has_header = any(row.is_header for row in rows)
-        
-        if not has_header:
-            # 如果没有表头，将第一行作为表头
-            rows[0].is_header = True
-            has_header = True
-        
-        # 生成表格行
-        for row_idx, row in enumerate(rows):
-            cells_text = [self._escape_cell_content(cell.content) for cell in row.cells]
-            lines.append('| ' + ' | '.join(cells_text) + ' |')
-            
-            # 在第一个表头行后添加分隔符
-            if row.is_header and (row_idx == 0 or not rows[row_idx + 1].is_header if row_idx + 1 < len(rows) else True):
-                separator = self._generate_separator_row(len(row.cells), alignments)
-                lines.append(separator)
+        # 表头为开头连续的表头行（第一行不是表头时将第一行作为表头），
+        # 只在表头的最后一行后添加一个分隔符
+        header_rows = table.header_rows
+        header_end = 0
+        if header_rows[0]:
+            while header_end + 1 < len(contents) and header_rows[header_end + 1]:
+                header_end += 1
         
-        return '\n'.join(lines) + '\n'
+        escape = self._escape_cell_content
+        lines = []
+        append = lines.append
+        for row_idx, row in enumerate(contents):
+            append(f"| {' | '.join([escape(text) for text in row])} |")
+            if row_idx == header_end:
+                append(self._generate_separator_row(len(row), alignments))
+        
+        # 末尾的换行一起拼接，不再单独追加
+        append('')
+        return '\n'.join(lines)
     
     def _generate_separator_row(self, num_cols: int, 
                                 alignments: List[str]) -> str:
-        """生成分隔符行"""
-        separators = []
-        
-        for i in range(num_cols):
-            align = alignments[i] if i < len(alignments) else 'left'
-            
-            if align == 'center':
-                separators.append(':---:')
-            elif align == 'right':
-                separators.append('---:')
-            else:
-                separators.append('---')
-        
-        return '| ' + ' | '.join(separators) + ' |'
+        """生成分隔符行（相同的列数和对齐方式共用缓存的结果）"""
+        aligns = tuple(alignments[:num_cols])
+        if len(aligns) < num_cols:
+            aligns += ('left',) * (num_cols - len(aligns))
+        return _separator_row(aligns)
     
     def _escape_cell_content(self, content: str) -> str:
         """转义单元格内容"""
-        # 转义管道符
-        content = content.replace('|', '\\|')
-        # 移除换行符
-        content = content.replace('\n', ' ')
-        # 清理多余空格
-        content = re.sub(r'\s+', ' ', content)
+        # 转义管道符，换行符和多余空格一起合并为一个空格
+        content = _WHITESPACE_RE.sub(' ', content.replace('|', '\\|'))
         return content.strip() or ' '
     
-    def _fallback_table_conversion(self, table: Tag) -> str:
+    def _fallback_table_conversion(self, table: Element) -> str:
         """降级的表格转换方法"""
         lines = ['| 内容 |', '| --- |']
         
-        for row in table.find_all('tr'):
-            cells = row.find_all(['td', 'th'])
+        for row in table.iter('tr'):
+            cells = list(row.iter('td', 'th'))
             if cells:
-                text = ' | '.join(cell.get_text().strip() for cell in cells)
+                text = ' | '.join(get_text(cell).strip() for cell in cells)
                 lines.append(f'| {text} |')
         
         return '\n'.join(lines) + '\n'
@@ -367,14 +382,14 @@ class TableHandler:
             return self._generate_html_table(rows, separator_idx, alignments)
             
         except Exception as e:
-            logger.warning(f"Markdown表格转HTML失败: {e}")
+            logger.warning("Markdown表格转HTML失败: %s", e)
             return markdown_table
     
     def _is_separator_row(self, cells: List[str]) -> bool:
         """检查是否是分隔符行"""
         for cell in cells:
             # 分隔符应该只包含 -、: 和空格
-            if not re.match(r'^:?-+:?$', cell.strip()):
+            if not _SEPARATOR_CELL_RE.match(cell.strip()):
                 return False
         return True
     
@@ -396,51 +411,64 @@ class TableHandler:
     def _generate_html_table(self, rows: List[List[str]], 
                             separator_idx: int,
                             alignments: List[str]) -> str:
-        """生成HTML表格"""
-        soup = BeautifulSoup(features='html.parser')
-        table = soup.new_tag('table')
+        """生成HTML表格（直接拼接字符串，不构建文档树）"""
+        align_attrs = [f' align="{align}"' for align in alignments]
+        
+        def cell_attrs(col_idx: int) -> str:
+            return align_attrs[col_idx] if col_idx < len(align_attrs) else ''
+        
+        parts = ['<table>']
         
         # 表头
         if separator_idx > 0:
-            thead = soup.new_tag('thead')
+            parts.append('<thead>')
             for row_data in rows[:separator_idx]:
-                tr = soup.new_tag('tr')
+                parts.append('<tr>')
                 for col_idx, cell_content in enumerate(row_data):
-                    th = soup.new_tag('th')
-                    if col_idx < len(alignments):
-                        th['align'] = alignments[col_idx]
-                    th.string = self._unescape_cell_content(cell_content)
-                    tr.append(th)
-                thead.append(tr)
-            table.append(thead)
+                    text = escape(self._unescape_cell_content(cell_content))
+                    parts.append(f'<th{cell_attrs(col_idx)}>{text}</th>')
+                parts.append('</tr>')
+            parts.append('</thead>')
         
         # 表体
-        tbody = soup.new_tag('tbody')
+        parts.append('<tbody>')
         start_idx = separator_idx if separator_idx >= 0 else 0
         for row_data in rows[start_idx:]:
-            tr = soup.new_tag('tr')
+            parts.append('<tr>')
             for col_idx, cell_content in enumerate(row_data):
-                td = soup.new_tag('td')
-                if col_idx < len(alignments):
-                    td['align'] = alignments[col_idx]
-                # 处理单元格内的Markdown格式
-                td.append(BeautifulSoup(self._process_cell_markdown(cell_content), 'html.parser'))
-                tr.append(td)
-            tbody.append(tr)
-        table.append(tbody)
-        
-        return str(table)
+                parts.append(f'<td{cell_attrs(col_idx)}>{self._cell_html(cell_content)}</td>')
+            parts.append('</tr>')
+        parts.append('</tbody></table>')
+        
+        return ''.join(parts)
+    
+    def _cell_html(self, content: str) -> str:
+        """生成单元格内的HTML（处理单元格内的Markdown格式）"""
+        html = self._process_cell_markdown(content)
+        # 纯文本单元格（最常见的情况）转义后直接使用
+        if '<' not in html and '&' not in html:
+            return escape(html)
+        
+        # 含有标签或实体时交给lxml解析，保证输出的结构完整
+        td = lxml_html.fragment_fromstring(html, create_parent='td')
+        return escape(td.text or '') + ''.join(
+            etree.tostring(child, encoding='unicode', method='html') for child in td
+        )
     
     def _process_cell_markdown(self, content: str) -> str:
         """处理单元格内的Markdown格式"""
-        # 处理粗体
-        content = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', content)
-        # 处理斜体
-        content = re.sub(r'\*(.+?)\*', r'<em>\1</em>', content)
-        # 处理代码
-        content = re.sub(r'`(.+?)`', r'<code>\1</code>', content)
-        # 处理链接
-        content = re.sub(r'\[(.+?)\]\((.+?)\)', r'<a href="\2">\1</a>', content)
+        # 先做字面量检查，纯文本单元格不运行正则
+        if '*' in content:
+            # 处理粗体
+            content = _BOLD_RE.sub(r'<strong>\1</strong>', content)
+            # 处理斜体
+            content = _ITALIC_RE.sub(r'<em>\1</em>', content)
+        if '`' in content:
+            # 处理代码
+            content = _CODE_RE.sub(r'<code>\1</code>', content)
+        if '](' in content:
+            # 处理链接
+            content = _LINK_RE.sub(r'<a href="\2">\1</a>', content)
         return content
     
     def _unescape_cell_content(self, content: str) -> str:
@@ -449,7 +477,7 @@ class TableHandler:
 
 
 # 便捷函数
-def html_table_to_markdown(table: Tag) -> str:
+def html_table_to_markdown(table: Element) -> str:
     """HTML表格转Markdown"""
     handler = TableHandler()
     return handler.html_table_to_markdown(table)
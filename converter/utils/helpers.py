@@ -1,33 +1,79 @@
 """辅助函数"""
+import os
 import re
 import hashlib
 import mimetypes
+import struct
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
-from typing import Union, Optional
+from typing import BinaryIO, Dict, Iterable, Optional, Set, Tuple, Union
 from ..config import Config
 
+# 预先加载MIME类型数据库
+mimetypes.init()
+
+# 非法字符替换表
+_FILENAME_TRANS = str.maketrans({c: '_' for c in Config.INVALID_FILENAME_CHARS})
+
 def sanitize_filename(filename: str) -> str:
     """清理文件名中的非法字符"""
-    safe_name = ''.join(
-        c if c not in Config.INVALID_FILENAME_CHARS else '_' 
-        for c in filename
-    )
-    return safe_name.strip()
+    return filename.translate(_FILENAME_TRANS).strip()
+
+# 资源哈希必须使用MD5：ENEX中en-media标签的hash属性按MD5引用资源，
+# 换用其他算法会导致Evernote无法关联附件
+
+# 常用算法直接调用构造函数，不经过hashlib.new按名称查找
+_HASH_CONSTRUCTORS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+}
+
+def _new_hash(algorithm: str, data: bytes = b''):
+    """创建哈希对象（仅用于资源标识，不涉及安全用途）"""
+    constructor = _HASH_CONSTRUCTORS.get(algorithm)
+    if constructor is None:
+        return hashlib.new(algorithm, data, usedforsecurity=False)
+    return constructor(data, usedforsecurity=False)
 
 def calculate_hash(data: bytes, algorithm: str = 'md5') -> str:
     """计算数据哈希值"""
-    hash_obj = hashlib.new(algorithm)
-    hash_obj.update(data)
-    return hash_obj.hexdigest()
+    return _new_hash(algorithm, data).hexdigest()
+
+def calculate_file_hash(path: Path, algorithm: str = 'md5') -> str:
+    """分块计算文件哈希值，不把整个文件读入内存"""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, lambda: _new_hash(algorithm)).hexdigest()
+        
+        hash_obj = _new_hash(algorithm)
+        while chunk := f.read(Config.HASH_CHUNK_SIZE):
+            hash_obj.update(chunk)
+        return hash_obj.hexdigest()
+
+# ENEX使用的固定宽度时间格式，如 20200101T083000Z
+_ENEX_TIMESTAMP_FORMAT = '%Y%m%dT%H%M%SZ'
+
+@lru_cache(maxsize=4096)
+def _strptime(timestamp: str, fmt: str) -> datetime:
+    """按格式解析时间戳，ENEX格式直接按位置切片，不走strptime"""
+    if (fmt == _ENEX_TIMESTAMP_FORMAT and len(timestamp) == 16
+            and timestamp[8] == 'T' and timestamp[15] == 'Z'
+            and timestamp[:8].isdigit() and timestamp[9:15].isdigit()):
+        return datetime(
+            int(timestamp[0:4]), int(timestamp[4:6]), int(timestamp[6:8]),
+            int(timestamp[9:11]), int(timestamp[11:13]), int(timestamp[13:15])
+        )
+    return datetime.strptime(timestamp, fmt)
 
 def parse_timestamp(timestamp: str, default: datetime = None) -> datetime:
-    """解析时间戳"""
+    """解析时间戳（相同的时间戳只解析一次）"""
     if not timestamp:
         return default or datetime.now()
     
     try:
-        return datetime.strptime(timestamp, Config.TIMESTAMP_FORMAT)
+        return _strptime(timestamp, Config.TIMESTAMP_FORMAT)
     except ValueError:
         return default or datetime.now()
 
@@ -35,15 +81,97 @@ def format_timestamp(dt: datetime) -> str:
     """格式化时间戳"""
     return dt.strftime(Config.TIMESTAMP_FORMAT)
 
+@lru_cache(maxsize=64)
 def guess_extension(mime_type: str) -> str:
     """根据MIME类型猜测文件扩展名"""
     ext = mimetypes.guess_extension(mime_type)
     return ext or '.bin'
 
-def find_file(filename: str, search_paths: list[Path]) -> Optional[Path]:
-    """在多个路径中查找文件"""
+@lru_cache(maxsize=1024)
+def guess_mime(suffix: str) -> str:
+    """根据文件扩展名(如'.jpg')猜测MIME类型"""
+    mime_type = mimetypes.guess_type(f'file{suffix.lower()}')[0]
+    return mime_type or 'application/octet-stream'
+
+def list_files(directory: Path) -> Set[str]:
+    """列出目录中的文件名（目录不存在时返回空集合）"""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries if entry.is_file()}
+    except OSError:
+        return set()
+
+def find_file(filename: str, search_paths: Iterable[Path],
+              dir_index: Optional[Dict[Path, Set[str]]] = None) -> Optional[Path]:
+    """
+    在多个路径中查找文件
+    
+    传入dir_index时每个目录只扫描一次，之后的查找大多只需查表；
+    表中没有时仍检查文件是否存在，保持文件系统的大小写规则
+    （Windows和macOS上不区分大小写），也能找到扫描后新增的文件
+    """
     for base_path in search_paths:
         file_path = base_path / filename
-        if file_path.exists() and file_path.is_file():
+        if dir_index is None:
+            if file_path.is_file():
+                return file_path
+            continue
+        
+        names = dir_index.get(file_path.parent)
+        if names is None:
+            names = dir_index[file_path.parent] = list_files(file_path.parent)
+        if file_path.name in names or file_path.is_file():
             return file_path
     return None
+
+# JPEG中携带图像尺寸的SOF标记（排除DHT/JPG/DAC）
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def read_image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """
+    只读取文件头获取图片尺寸(宽, 高)
+    
+    支持PNG、GIF和JPEG，无法识别时返回None
+    """
+    with open(path, 'rb') as f:
+        head = f.read(24)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:2] == b'\xff\xd8':
+            f.seek(2)
+            return _read_jpeg_size(f)
+    return None
+
+def _read_jpeg_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """逐段跳过JPEG标记，直到读到SOF段中的尺寸"""
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        
+        # 跳过填充的0xFF
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        
+        code = marker[0]
+        # 不带长度的独立标记
+        if code == 0x01 or 0xD0 <= code <= 0xD9:
+            continue
+        
+        segment = f.read(2)
+        if len(segment) < 2:
+            return None
+        if code in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        f.seek(struct.unpack('>H', segment)[0] - 2, 1)
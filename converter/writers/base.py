@@ -1,7 +1,7 @@
 """写入器基类"""
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Union
+from typing import Iterable, Union
 from ..models import Note
 
 class BaseWriter(ABC):
@@ -23,7 +23,10 @@ class BaseWriter(ABC):
         """写入单个笔记"""
         pass
     
-    def write_all(self, notes: List[Note]) -> None:
-        """写入多个笔记"""
+    def write_all(self, notes: Iterable[Note]) -> int:
+        """写入多个笔记，返回笔记数量"""
+        count = 0
         for note in notes:
-            self.write(note)
\ No newline at end of file
+            self.write(note)
+            count += 1
+        return count
\ No newline at end of file
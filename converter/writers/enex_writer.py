@@ -1,6 +1,7 @@
 """ENEX格式写入器"""
 import base64
-from bs4 import BeautifulSoup, CData, Doctype
+from typing import BinaryIO, Iterable, List, Tuple, Union
+from xml.sax.saxutils import escape
 
 from .base import BaseWriter
 from ..models import Note, Resource
@@ -10,150 +11,174 @@ from ..config import Config
 
 logger = get_logger()
 
+ENEX_HEADER = (
+    b'<?xml version="1.0" encoding="utf-8"?>\n'
+    b'<!DOCTYPE en-export SYSTEM '
+    b'"http://xml.evernote.com/pub/evernote-export3.dtd">\n'
+    b'<en-export>'
+)
+ENEX_FOOTER = b'</en-export>'
+
+ENML_TEMPLATE = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<!DOCTYPE en-note SYSTEM '
+    '"http://xml.evernote.com/pub/enml2.dtd">\n'
+    '<en-note>{body}</en-note>'
+)
+
 class EnexWriter(BaseWriter):
-    """ENEX文件写入器"""
+    """
+    ENEX文件写入器
+    
+    笔记按写入顺序直接流式输出到文件，不在内存中保留整个文档
+    """
     
     def __init__(self, output: str):
         super().__init__(output)
-        self._init_document()
+        self._file = None
     
-    def _init_document(self) -> None:
-        """初始化ENEX文档"""
-        self.soup = BeautifulSoup(features="xml")
-        doctype = Doctype(
-            'en-export SYSTEM '
-            '"http://xml.evernote.com/pub/evernote-export3.dtd"'
-        )
-        self.soup.append(doctype)
-        self.root = self.soup.new_tag("en-export")
-        self.soup.append(self.root)
+    def _ensure_open(self) -> None:
+        """打开输出文件并写入文档头"""
+        if self._file is None:
+            # 笔记的各个片段很小，使用较大的缓冲区合并成少量的系统调用
+            self._file = open(self.output, 'wb', buffering=Config.WRITE_BUFFER_SIZE)
+            self._file.write(ENEX_HEADER)
     
     def write(self, note: Note) -> None:
-        """添加笔记到文档"""
-        note_elem = self._create_note_element(note)
-        self.root.append(note_elem)
+        """写入笔记到文件"""
+        try:
+            note_head = self._create_note_element(note)
+        except Exception as e:
+            logger.error("写入笔记失败 %s: %s", note.title, e)
+            return
+        
+        self._ensure_open()
+        self._file.write(note_head)
+        
+        # 资源数据逐块编码写出，不在内存中保留完整的base64文本
+        for resource in note.resources:
+            self._write_resource(resource)
+        
+        self._file.write(b'</note>')
     
     def save(self) -> None:
-        """保存ENEX文件"""
-        with open(self.output, 'w', encoding='utf-8') as f:
-            f.write(str(self.soup))
-        logger.info(f"已保存ENEX文件: {self.output}")
+        """写入文档尾并关闭ENEX文件"""
+        self._ensure_open()
+        self._file.write(ENEX_FOOTER)
+        self.close()
+        logger.info("已保存ENEX文件: %s", self.output)
     
-    def write_all(self, notes: list[Note]) -> None:
-        """写入所有笔记并保存"""
-        for note in notes:
-            self.write(note)
-        self.save()
+    def close(self) -> None:
+        """关闭ENEX文件（未调用save时不写入文档尾）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
     
-    def _create_note_element(self, note: Note):
-        """创建笔记元素"""
-        elem = self.soup.new_tag('note')
-        
-        # 标题
-        title = self.soup.new_tag('title')
-        title.string = note.title
-        elem.append(title)
-        
-        # 内容
-        content = self.soup.new_tag('content')
-        content.string = CData(self._create_enml_content(note.content))
-        elem.append(content)
-        
-        # 时间戳
-        created = self.soup.new_tag('created')
-        created.string = format_timestamp(note.created)
-        elem.append(created)
-        
-        updated = self.soup.new_tag('updated')
-        updated.string = format_timestamp(note.updated)
-        elem.append(updated)
+    def write_all(self, notes: Iterable[Note]) -> int:
+        """写入所有笔记并保存（读取笔记出错时也会关闭文件）"""
+        try:
+            count = super().write_all(notes)
+            self.save()
+        finally:
+            self.close()
+        return count
+    
+    def _create_note_element(self, note: Note) -> bytes:
+        """创建笔记元素中资源之前的部分"""
+        parts = [
+            '<note>',
+            # 标题
+            f'<title>{escape(note.title)}</title>',
+            # 内容
+            f'<content><![CDATA[{self._create_enml_content(note.content)}]]></content>',
+            # 时间戳
+            f'<created>{format_timestamp(note.created)}</created>',
+            f'<updated>{format_timestamp(note.updated)}</updated>',
+        ]
         
         # 标签
         for tag in note.tags:
-            tag_elem = self.soup.new_tag('tag')
-            tag_elem.string = tag
-            elem.append(tag_elem)
+            parts.append(f'<tag>{escape(tag)}</tag>')
         
         # 属性
-        attrs = self._create_attributes(note)
-        if attrs.contents:
-            elem.append(attrs)
+        parts.append(self._create_attributes(note))
         
-        # 资源
-        for resource in note.resources:
-            res_elem = self._create_resource_element(resource)
-            elem.append(res_elem)
-        
-        return elem
+        return ''.join(parts).encode('utf-8')
     
     def _create_enml_content(self, content: str) -> str:
         """创建ENML内容"""
-        soup = BeautifulSoup(features="xml")
-        doctype = Doctype(
-            'en-note SYSTEM '
-            '"http://xml.evernote.com/pub/enml2.dtd"'
-        )
-        soup.append(doctype)
-        
-        en_note = self.soup.new_tag('en-note')
-        en_note.string = content
-        soup.append(en_note)
-        
-        return str(soup)
+        return ENML_TEMPLATE.format(body=escape(content))
     
-    def _create_attributes(self, note: Note):
-        """创建笔记属性元素"""
-        attrs = self.soup.new_tag('note-attributes')
+    def _create_attributes(self, note: Note) -> str:
+        """创建笔记属性元素（无属性时返回空字符串）"""
+        parts: List[str] = []
         
         if note.author:
-            author = self.soup.new_tag('author')
-            author.string = note.author
-            attrs.append(author)
+            parts.append(f'<author>{escape(note.author)}</author>')
         
         if note.source_url:
-            source = self.soup.new_tag('source-url')
-            source.string = note.source_url
-            attrs.append(source)
+            parts.append(f'<source-url>{escape(note.source_url)}</source-url>')
         
         if note.notebook:
-            notebook = self.soup.new_tag('notebook')
-            notebook.string = note.notebook
-            attrs.append(notebook)
+            parts.append(f'<notebook>{escape(note.notebook)}</notebook>')
         
-        return attrs
+        if not parts:
+            return ''
+        return f"<note-attributes>{''.join(parts)}</note-attributes>"
     
-    def _create_resource_element(self, resource: Resource):
-        """创建资源元素"""
-        elem = self.soup.new_tag('resource')
-        
+    def _write_resource(self, resource: Resource) -> None:
+        """写入资源元素"""
+        try:
+            head, tail = self._create_resource_element(resource)
+            # 先打开数据源，读取失败时跳过该资源，不留下残缺的元素
+            source = self._open_resource_data(resource)
+        except Exception as e:
+            logger.error("写入资源失败 %s: %s", resource.file_name or resource.hash, e)
+            return
+        
+        # 每块长度是3的倍数，逐块编码拼接的结果与整体编码一致
+        chunk_size = Config.BASE64_CHUNK_SIZE
+        self._file.write(head)
+        if isinstance(source, bytes):
+            # 已载入的数据按切片编码，不生成完整的base64副本
+            view = memoryview(source)
+            for start in range(0, len(view), chunk_size):
+                self._file.write(base64.b64encode(view[start:start + chunk_size]))
+        else:
+            with source:
+                while chunk := source.read(chunk_size):
+                    self._file.write(base64.b64encode(chunk))
+        self._file.write(tail)
+    
+    def _open_resource_data(self, resource: Resource) -> Union[bytes, BinaryIO]:
+        """获取资源数据：已载入时直接返回字节，否则打开来源文件"""
+        if resource.data is None and resource.path is not None:
+            return open(resource.path, 'rb')
+        return resource.read_data()
+    
+    def _create_resource_element(self, resource: Resource) -> Tuple[bytes, bytes]:
+        """创建资源元素，返回数据前后的字节片段"""
         # 数据
-        data = self.soup.new_tag('data')
-        data['encoding'] = 'base64'
-        data['hash'] = resource.hash
-        data.string = base64.b64encode(resource.data).decode()
-        elem.append(data)
+        hash_value = escape(resource.hash, {'"': '&quot;'})
+        head = f'<resource><data encoding="base64" hash="{hash_value}">'
+        
+        parts = ['</data>']
         
         # MIME类型
-        mime = self.soup.new_tag('mime')
-        mime.string = resource.mime
-        elem.append(mime)
+        parts.append(f'<mime>{escape(resource.mime)}</mime>')
         
         # 尺寸(图片)
         if resource.width and resource.height:
-            width = self.soup.new_tag('width')
-            width.string = str(resource.width)
-            elem.append(width)
-            
-            height = self.soup.new_tag('height')
-            height.string = str(resource.height)
-            elem.append(height)
+            parts.append(f'<width>{resource.width}</width>')
+            parts.append(f'<height>{resource.height}</height>')
         
         # 文件名
         if resource.file_name:
-            attrs = self.soup.new_tag('resource-attributes')
-            filename = self.soup.new_tag('file-name')
-            filename.string = resource.file_name
-            attrs.append(filename)
-            elem.append(attrs)
-        
-        return elem
\ No newline at end of file
+            parts.append(
+                '<resource-attributes>'
+                f'<file-name>{escape(resource.file_name)}</file-name>'
+                '</resource-attributes>'
+            )
+        
+        parts.append('</resource>')
+        return head.encode('utf-8'), ''.join(parts).encode('utf-8')
@@ -1,11 +1,16 @@
 """Markdown格式写入器"""
+import multiprocessing
+import os
 import re
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import frontmatter
-from bs4 import BeautifulSoup
 
 from .base import BaseWriter
-from ..models import Note
+from ..models import Note, Resource
 from ..utils.logger import get_logger
 from ..utils.helpers import sanitize_filename, format_timestamp, guess_extension
 from ..processors.html_converter import HtmlToMarkdownConverter
@@ -13,77 +18,246 @@ from ..config import Config
 
 logger = get_logger()
 
+# ENEX媒体标签: <en-media hash="xxx" .../>
+_EN_MEDIA_RE = re.compile(r'<en-media[^>]*?\bhash="([^"]*)"[^>]*?(?:></en-media>|/>)')
+
+# 独占创建输出文件(Windows下需要O_BINARY避免换行符转换)
+_EXCL_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+
+# 子进程内复用的转换器
+_worker_converters: Dict[str, HtmlToMarkdownConverter] = {}
+
+def _convert_html(converter_type: str, html: str) -> str:
+    """在子进程中转换HTML到Markdown"""
+    converter = _worker_converters.get(converter_type)
+    if converter is None:
+        converter = HtmlToMarkdownConverter(converter_type)
+        _worker_converters[converter_type] = converter
+    return converter.convert(html)
+
+def _process_context():
+    """
+    转换进程池的启动方式
+    
+    Python 3.11起使用fork时所有子进程在首次提交任务时一起创建；
+    更早的版本按需逐个fork，可能在附件线程运行时fork，改用forkserver
+    """
+    if sys.version_info < (3, 11) and multiprocessing.get_start_method() == 'fork':
+        return multiprocessing.get_context('forkserver')
+    return None
+
 class MarkdownWriter(BaseWriter):
     """Markdown文件写入器"""
     
-    def __init__(self, output: str, converter_type: str = 'soup'):
+    def __init__(self, output: str, converter_type: str = 'soup',
+                 workers: Optional[int] = None):
         super().__init__(output)
         self.assets_dir = self.output / Config.ASSETS_DIR_NAME
         self.assets_dir.mkdir(parents=True, exist_ok=True)
+        self.converter_type = converter_type
         self.html_converter = HtmlToMarkdownConverter(converter_type)
+        self.workers = workers or Config.MAX_WORKERS or os.cpu_count() or 1
+        self._name_counters: Dict[str, int] = {}
+        self._written_assets: Dict[str, str] = {}  # 哈希 -> 已写入的文件名
+        self._asset_names: Set[str] = set()  # 已使用的附件文件名（忽略大小写）
+        # 附件在线程池中写入，与笔记转换重叠进行（线程池在首次写入时创建）
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._queued_assets: List[Tuple[Path, bytes]] = []  # 待提交的附件写入
+        self._pending_assets = deque()  # 已提交的附件写入
     
     def write(self, note: Note) -> None:
-        """写入单个笔记"""
+        """
+        写入单个笔记
+        
+        附件在线程池中写入，与之后笔记的转换重叠进行，不等待写入完成；
+        全部写入后需调用close（write_all会自动调用）
+        """
         try:
             # 处理资源
             content = self._process_resources(note)
+            self._submit_assets()
             
             # 转换HTML到Markdown
             markdown_content = self.html_converter.convert(content)
             
-            # 创建元数据
-            metadata = self._create_metadata(note)
-            
-            # 创建frontmatter文档
-            post = frontmatter.Post(markdown_content, **metadata)
-            
-            # 保存文件
-            filename = sanitize_filename(note.title) + '.md'
-            filepath = self.output / filename
-            
-            # 避免文件名冲突
-            filepath = self._get_unique_filepath(filepath)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(frontmatter.dumps(post))
+            self._save_note(note, markdown_content)
             
-            logger.info(f"已保存: {filepath.name}")
+        except Exception as e:
+            logger.error("写入笔记失败 %s: %s", note.title, e)
+        finally:
+            self._submit_assets()
+    
+    def close(self) -> None:
+        """等待附件写入完成并关闭线程池"""
+        self._flush_assets()
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
+    
+    def write_all(self, notes: Iterable[Note]) -> int:
+        """写入多个笔记，完成后关闭附件线程池"""
+        try:
+            if self.workers <= 1:
+                return super().write_all(notes)
+            return self._write_all_parallel(notes)
+        finally:
+            self.close()
+    
+    def _write_all_parallel(self, notes: Iterable[Note]) -> int:
+        """
+        在进程池中并行转换多个笔记
+        
+        HTML到Markdown的转换在进程池中并行执行，资源和文件写入仍在
+        主进程中按顺序完成，以保证文件名去重的结果与串行一致。
+        附件写入在转换任务提交之后才提交，子进程创建时附件线程池还未启动，
+        避免带着运行中的线程fork（见_process_context）。
+        """
+        # 之前单独写入的笔记可能已经启动了附件线程池
+        self.close()
+        
+        # 限制在途任务数，避免一次性持有所有笔记
+        max_pending = self.workers * 4
+        pending = deque()
+        count = 0
+        
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 mp_context=_process_context()) as executor:
+            for note in notes:
+                count += 1
+                try:
+                    content = self._process_resources(note)
+                except Exception as e:
+                    logger.error("写入笔记失败 %s: %s", note.title, e)
+                    continue
+                
+                future = executor.submit(_convert_html, self.converter_type, content)
+                pending.append((note, future))
+                self._submit_assets()
+                if len(pending) >= max_pending:
+                    self._finish(*pending.popleft())
             
+            while pending:
+                self._finish(*pending.popleft())
+        
+        return count
+    
+    def _finish(self, note: Note, future: Future) -> None:
+        """等待并行转换结果并保存笔记"""
+        try:
+            self._save_note(note, future.result())
         except Exception as e:
-            logger.error(f"写入笔记失败 {note.title}: {e}")
+            logger.error("写入笔记失败 %s: %s", note.title, e)
+    
+    def _save_note(self, note: Note, markdown_content: str) -> None:
+        """保存转换后的笔记"""
+        # 创建元数据
+        metadata = self._create_metadata(note)
+        
+        # 创建frontmatter文档
+        post = frontmatter.Post(markdown_content, **metadata)
+        
+        # 保存文件
+        filename = sanitize_filename(note.title) + '.md'
+        filepath = self.output / filename
+        
+        # 先整体编码，再一次写入新建的唯一文件
+        payload = frontmatter.dumps(post).encode('utf-8')
+        filepath, fd = self._create_unique_file(filepath)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        
+        logger.info("已保存: %s", filepath.name)
     
     def _process_resources(self, note: Note) -> str:
         """处理资源并更新内容"""
-        content = note.content
+        links: Dict[str, str] = {}
         
         for resource in note.resources:
-            # 确定文件名
-            if not resource.file_name:
-                ext = guess_extension(resource.mime)
-                resource.file_name = f"{resource.hash}{ext}"
-            
-            # 保存资源
-            asset_path = self.assets_dir / resource.file_name
-            with open(asset_path, 'wb') as f:
-                f.write(resource.data)
+            # 相同内容的资源只写入一次，复用已有文件
+            written_name = self._written_assets.get(resource.hash)
+            if written_name:
+                resource.file_name = written_name
+            else:
+                # 确定文件名
+                resource.file_name = self._asset_name(resource)
+                
+                # 保存资源
+                self._write_asset(self.assets_dir / resource.file_name, resource.read_data())
+                self._written_assets[resource.hash] = resource.file_name
             
-            # 替换内容中的引用
             relative_path = f"{Config.ASSETS_DIR_NAME}/{resource.file_name}"
-            content = self._replace_media_tag(content, resource, relative_path)
+            links.setdefault(resource.hash, self._media_link(resource, relative_path))
+        
+        if not links:
+            return note.content
         
-        return content
+        # 按哈希索引，一次扫描替换内容中的所有媒体标签
+        return _EN_MEDIA_RE.sub(
+            lambda m: links.get(m.group(1), m.group(0)), note.content
+        )
     
-    def _replace_media_tag(self, content: str, resource, path: str) -> str:
-        """替换ENEX媒体标签为Markdown格式"""
-        # 匹配 <en-media hash="xxx" .../>
-        pattern = rf'<en-media[^>]*?hash="{resource.hash}"[^>]*?(?:></en-media>|/>)'
+    def _asset_name(self, resource: Resource) -> str:
+        """
+        确定附件文件名
         
-        if resource.mime.startswith('image/'):
-            replacement = f'![{resource.file_name}]({path})'
-        else:
-            replacement = f'[{resource.file_name}]({path})'
+        不同内容的附件同名时（如多个image.png），在文件名后加上哈希，
+        避免后写入的附件覆盖已被其他笔记引用的文件
+        """
+        name = resource.file_name or f"{resource.hash}{guess_extension(resource.mime)}"
+        if name.lower() in self._asset_names:
+            path = Path(name)
+            name = f"{path.stem}_{resource.hash[:8]}{path.suffix}"
+            if name.lower() in self._asset_names:
+                name = f"{path.stem}_{resource.hash}{path.suffix}"
+        self._asset_names.add(name.lower())
+        return name
+    
+    def _write_asset(self, path: Path, data: bytes) -> None:
+        """登记附件写入，由_submit_assets提交到线程池"""
+        self._queued_assets.append((path, data))
+    
+    def _submit_assets(self) -> None:
+        """把登记的附件写入提交到线程池"""
+        if not self._queued_assets:
+            return
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=Config.IO_WORKERS)
         
-        return re.sub(pattern, replacement, content)
+        queued, self._queued_assets = self._queued_assets, []
+        for path, data in queued:
+            # 同一路径不能同时写入，先等待之前提交的写入完成
+            if any(pending == path for pending, _ in self._pending_assets):
+                while True:
+                    pending, future = self._pending_assets.popleft()
+                    self._wait_asset(pending, future)
+                    if pending == path:
+                        break
+            
+            # 限制排队的写入数量，避免附件数据在内存中堆积
+            if len(self._pending_assets) >= Config.IO_WORKERS * 4:
+                self._wait_asset(*self._pending_assets.popleft())
+            
+            future = self._io_pool.submit(path.write_bytes, data)
+            self._pending_assets.append((path, future))
+    
+    def _wait_asset(self, path: Path, future: Future) -> None:
+        """等待附件写入完成"""
+        try:
+            future.result()
+        except Exception as e:
+            logger.error("保存附件失败 %s: %s", path.name, e)
+    
+    def _flush_assets(self) -> None:
+        """提交登记的附件写入并等待全部完成"""
+        self._submit_assets()
+        while self._pending_assets:
+            self._wait_asset(*self._pending_assets.popleft())
+    
+    def _media_link(self, resource: Resource, path: str) -> str:
+        """生成资源对应的Markdown链接"""
+        if resource.mime.startswith('image/'):
+            return f'![{resource.file_name}]({path})'
+        return f'[{resource.file_name}]({path})'
     
     def _create_metadata(self, note: Note) -> dict:
         """创建frontmatter元数据"""
@@ -104,17 +278,25 @@ class MarkdownWriter(BaseWriter):
         
         return metadata
     
-    def _get_unique_filepath(self, filepath: Path) -> Path:
-        """获取唯一的文件路径(避免覆盖)"""
-        if not filepath.exists():
-            return filepath
+    def _create_unique_file(self, filepath: Path) -> Tuple[Path, int]:
+        """
+        创建唯一的文件(避免覆盖)，返回路径和已打开的文件描述符
         
+        按文件名记录下一个可用序号，并以独占方式创建文件，
+        重名笔记不必每次都从头逐个检查已存在的文件
+        """
         stem = filepath.stem
         suffix = filepath.suffix
-        counter = 1
+        counter = self._name_counters.get(stem, 0)
         
         while True:
-            new_path = filepath.parent / f"{stem}_{counter}{suffix}"
-            if not new_path.exists():
-                return new_path
-            counter += 1
\ No newline at end of file
+            name = f"{stem}_{counter}{suffix}" if counter else filepath.name
+            new_path = filepath.parent / name
+            try:
+                fd = os.open(new_path, _EXCL_WRITE_FLAGS, 0o644)
+            except FileExistsError:
+                counter += 1
+                continue
+            
+            self._name_counters[stem] = counter + 1
+            return new_path, fd
@@ -1,14 +1,21 @@
+from concurrent.futures import ProcessPoolExecutor
+
 from converter import Converter
 
+def convert_enex_file(enex_file: str) -> None:
+    """转换单个ENEX文件（在子进程中执行，文件内部串行转换）"""
+    output_dir = 'output/' + enex_file.split('.')[0] + '/'
+    Converter.enex_to_markdown(enex_file, output_dir, workers=1)
+
 if __name__ == '__main__':
     # Convert ENEX to Markdown
     file_list = [
         '读书讲座电影音乐.enex', '国科大课程笔记.enex', '经验机会笔记.enex', '课堂笔记.enex', '理化所科研笔记.enex', 
         '数学笔记.enex', '项目规划笔记.enex', '娱乐.enex', '杂记.enex', '杂录.enex', 
     ]
-    for enex_file in file_list:
-        output_dir = 'output/' + enex_file.split('.')[0] + '/'
-        Converter.enex_to_markdown(enex_file, output_dir)
+    # 各文件相互独立，在进程池中并行转换
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(convert_enex_file, file_list))
     
     # # Convert Markdown to ENEX
     # markdown_dir = 'output/'
@@ -0,0 +1,48 @@
+"""ENEX写入器的测试"""
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from converter.models import Note, Resource
+from converter.parsers.enex_parser import EnexParser
+from converter.writers.enex_writer import EnexWriter
+
+def _notes():
+    now = datetime(2020, 1, 1)
+    note = Note(title='a & b', content='<div>x</div>', created=now, updated=now, tags=['t'])
+    # 数据长度超过一个编码块，检查分块编码的结果
+    note.add_resource(Resource(mime='application/octet-stream', data=bytes(range(256)) * 4000,
+                               hash='h1', file_name='data.bin'))
+    yield note
+
+class EnexWriterTest(unittest.TestCase):
+    """流式写入ENEX文件"""
+    
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output = Path(self._tmp.name) / 'notes.enex'
+    
+    def tearDown(self):
+        self._tmp.cleanup()
+    
+    def test_streamed_output_parses_back(self):
+        self.assertEqual(EnexWriter(self.output).write_all(_notes()), 1)
+        notes = list(EnexParser(self.output).parse())
+        self.assertEqual([note.title for note in notes], ['a & b'])
+        self.assertEqual(notes[0].resources[0].data, bytes(range(256)) * 4000)
+    
+    def test_file_closed_when_notes_fail(self):
+        def failing():
+            yield from _notes()
+            raise RuntimeError('boom')
+        
+        writer = EnexWriter(self.output)
+        with self.assertRaises(RuntimeError):
+            writer.write_all(failing())
+        self.assertIsNone(writer._file)
+        # 已写入的内容全部落盘，但没有文档尾
+        self.assertTrue(self.output.read_bytes().endswith(b'</note>'))
+
+if __name__ == '__main__':
+    unittest.main()
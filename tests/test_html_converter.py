@@ -0,0 +1,69 @@
+"""HTML到Markdown转换的测试"""
+import tempfile
+import unittest
+from pathlib import Path
+
+from converter.config import Config
+from converter.processors.html_converter import HtmlToMarkdownConverter, _cache_fingerprint
+
+ENTITY_HTML = '<en-note><div>caf&#233; it&#8217;s&#160;x &#8212; y</div></en-note>'
+
+class CharacterReferenceTest(unittest.TestCase):
+    """字符引用应展开为原字符，而不是ASCII近似字符"""
+    
+    def test_entities_keep_unicode(self):
+        for converter_type in ('soup', 'html2text'):
+            with self.subTest(converter_type=converter_type):
+                markdown = HtmlToMarkdownConverter(converter_type).convert(ENTITY_HTML)
+                self.assertIn('café', markdown)
+                self.assertIn('it’s', markdown)
+                self.assertIn('—', markdown)
+                self.assertNotIn('--', markdown)
+    
+    def test_html2text_same_with_and_without_table(self):
+        converter = HtmlToMarkdownConverter('html2text')
+        table = '<table><tr><td>a</td></tr></table>'
+        plain = converter.convert(ENTITY_HTML)
+        with_table = converter.convert(ENTITY_HTML.replace('</en-note>', table + '</en-note>'))
+        self.assertTrue(with_table.startswith(plain))
+
+class ConversionCacheTest(unittest.TestCase):
+    """转换缓存默认关闭，磁盘缓存按版本指纹分目录并整体写入"""
+    
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved = Config.MARKDOWN_CACHE_SIZE, Config.MARKDOWN_CACHE_DIR
+    
+    def tearDown(self):
+        Config.MARKDOWN_CACHE_SIZE, Config.MARKDOWN_CACHE_DIR = self._saved
+        self._tmp.cleanup()
+    
+    def test_no_cache_by_default(self):
+        converter = HtmlToMarkdownConverter()
+        converter.convert('<div>x</div>')
+        self.assertEqual(converter._cache, {})
+    
+    def test_disk_cache(self):
+        Config.MARKDOWN_CACHE_DIR = self._tmp.name
+        markdown = HtmlToMarkdownConverter().convert('<div><b>x</b></div>')
+        
+        files = [path for path in Path(self._tmp.name).rglob('*') if path.is_file()]
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].suffix, '.md')
+        self.assertEqual(files[0].relative_to(self._tmp.name).parts[:2],
+                         ('soup', _cache_fingerprint('soup')))
+        
+        # 命中缓存时不再转换
+        converter = HtmlToMarkdownConverter()
+        converter._convert = None
+        self.assertEqual(converter.convert('<div><b>x</b></div>'), markdown)
+    
+    def test_memory_cache_is_bounded(self):
+        Config.MARKDOWN_CACHE_SIZE = 2
+        converter = HtmlToMarkdownConverter()
+        for text in 'abc':
+            converter.convert(f'<div>{text}</div>')
+        self.assertEqual(len(converter._cache), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Markdown写入器的测试：笔记文件名和附件文件名的冲突处理"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from converter.models import Note, Resource
+from converter.writers.markdown_writer import MarkdownWriter
+
+def _resource(data: bytes, hash_value: str, file_name=None, mime='image/png') -> Resource:
+    return Resource(mime=mime, data=data, hash=hash_value, file_name=file_name)
+
+class WriterTestCase(unittest.TestCase):
+    """每个测试使用临时输出目录"""
+    
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output = Path(self._tmp.name) / 'out'
+        self.writer = MarkdownWriter(self.output, workers=1)
+    
+    def tearDown(self):
+        self.writer.close()
+        self._tmp.cleanup()
+
+class UniqueFileTest(WriterTestCase):
+    """同名笔记依次加上序号，不覆盖已有文件"""
+    
+    def create(self, name: str) -> str:
+        path, fd = self.writer._create_unique_file(self.output / name)
+        os.close(fd)
+        return path.name
+    
+    def test_numbers_duplicates(self):
+        names = [self.create('note.md') for _ in range(3)]
+        self.assertEqual(names, ['note.md', 'note_1.md', 'note_2.md'])
+    
+    def test_skips_existing_files(self):
+        (self.output / 'note.md').write_text('existing')
+        (self.output / 'note_1.md').write_text('existing')
+        self.assertEqual(self.create('note.md'), 'note_2.md')
+        self.assertEqual((self.output / 'note.md').read_text(), 'existing')
+    
+    def test_names_are_independent(self):
+        self.assertEqual(self.create('a.md'), 'a.md')
+        self.assertEqual(self.create('b.md'), 'b.md')
+        self.assertEqual(self.create('a.md'), 'a_1.md')
+
+class AssetNameTest(WriterTestCase):
+    """不同内容的附件使用不同的文件名，相同内容的附件只写入一次"""
+    
+    def write_notes(self, *resource_lists) -> list:
+        """写入带有附件的笔记，返回各笔记的Markdown内容"""
+        now = datetime(2020, 1, 1)
+        for idx, resources in enumerate(resource_lists):
+            content = ''.join(f'<en-media type="{r.mime}" hash="{r.hash}"/>' for r in resources)
+            note = Note(title=f'n{idx}', content=content, created=now, updated=now,
+                        resources=list(resources))
+            self.writer.write(note)
+        self.writer.close()
+        return [(self.output / f'n{idx}.md').read_text(encoding='utf-8')
+                for idx in range(len(resource_lists))]
+    
+    def test_same_name_different_content(self):
+        first = self.writer._asset_name(_resource(b'a', 'aaaaaaaa11', 'image.png'))
+        second = self.writer._asset_name(_resource(b'b', 'bbbbbbbb22', 'image.png'))
+        self.assertEqual(first, 'image.png')
+        self.assertEqual(second, 'image_bbbbbbbb.png')
+    
+    def test_names_compared_case_insensitively(self):
+        self.writer._asset_name(_resource(b'a', 'aaaaaaaa11', 'image.png'))
+        name = self.writer._asset_name(_resource(b'b', 'bbbbbbbb22', 'Image.PNG'))
+        self.assertEqual(name, 'Image_bbbbbbbb.PNG')
+    
+    def test_full_hash_when_short_name_taken(self):
+        self.writer._asset_name(_resource(b'a', 'aaaaaaaa11', 'image.png'))
+        self.writer._asset_name(_resource(b'b', 'bbbbbbbb22', 'image_cccccccc.png'))
+        self.writer._asset_name(_resource(b'c', 'cccccccc33', 'image.png'))
+        name = self.writer._asset_name(_resource(b'd', 'cccccccc44', 'image.png'))
+        self.assertEqual(name, 'image_cccccccc44.png')
+    
+    def test_missing_name_uses_hash(self):
+        name = self.writer._asset_name(_resource(b'a', 'aaaaaaaa11'))
+        self.assertEqual(name, 'aaaaaaaa11.png')
+    
+    def test_notes_link_their_own_content(self):
+        red = _resource(b'red' * 1000, 'aaaaaaaa11', 'image.png')
+        blue = _resource(b'blue' * 1000, 'bbbbbbbb22', 'image.png')
+        red_again = _resource(b'red' * 1000, 'aaaaaaaa11', 'image.png')
+        first, second, third = self.write_notes([red, blue], [blue], [red_again])
+        
+        assets = self.output / 'assets'
+        self.assertEqual(sorted(os.listdir(assets)), ['image.png', 'image_bbbbbbbb.png'])
+        self.assertEqual((assets / 'image.png').read_bytes(), b'red' * 1000)
+        self.assertEqual((assets / 'image_bbbbbbbb.png').read_bytes(), b'blue' * 1000)
+        self.assertIn('(assets/image.png)', first)
+        self.assertIn('(assets/image_bbbbbbbb.png)', first)
+        self.assertIn('(assets/image_bbbbbbbb.png)', second)
+        self.assertIn('(assets/image.png)', third)
+
+if __name__ == '__main__':
+    unittest.main()
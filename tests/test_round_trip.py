@@ -0,0 +1,128 @@
+"""ENEX -> Markdown -> ENEX 往返转换的测试（串行与并行结果一致）"""
+import base64
+import hashlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from converter import Converter
+from converter.parsers.enex_parser import EnexParser
+
+def _png(color: str) -> bytes:
+    """生成一个小的PNG图片"""
+    buf = io.BytesIO()
+    Image.new('RGB', (7, 5), color).save(buf, format='PNG')
+    return buf.getvalue()
+
+def _resource(data: bytes, mime: str, file_name: str) -> str:
+    """生成ENEX资源元素"""
+    return (
+        f'<resource><data encoding="base64">{base64.b64encode(data).decode()}</data>'
+        f'<mime>{mime}</mime>'
+        f'<resource-attributes><file-name>{file_name}</file-name></resource-attributes>'
+        '</resource>'
+    )
+
+def _note(title: str, body: str, resources=()) -> str:
+    """生成ENEX笔记元素，正文中按顺序引用各资源"""
+    media = ''.join(
+        f'<en-media type="{mime}" hash="{hashlib.md5(data).hexdigest()}"/>'
+        for data, mime, _ in resources
+    )
+    return (
+        f'<note><title>{title}</title>'
+        '<content><![CDATA[<?xml version="1.0" encoding="UTF-8"?>'
+        '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">'
+        f'<en-note>{body}{media}</en-note>]]></content>'
+        '<created>20200101T000000Z</created><updated>20200102T000000Z</updated>'
+        '<tag>t1</tag>'
+        f"{''.join(_resource(*resource) for resource in resources)}"
+        '</note>'
+    )
+
+RED = _png('red')
+BLUE = _png('blue')
+PDF = b'%PDF-1.4 test attachment'
+
+NOTES = [
+    _note('Note A', '<h1>Title &amp; stuff</h1><div>caf&#233; <b>bold</b></div>'
+          '<table><thead><tr><th>a</th><th>b</th></tr><tr><th>c</th><th>d</th></tr></thead>'
+          '<tbody><tr><td colspan="2">merged</td></tr></tbody></table>',
+          [(RED, 'image/png', 'image.png'), (PDF, 'application/pdf', 'doc.pdf')]),
+    # 不同内容的同名附件
+    _note('Note B', '<div>second image</div>', [(BLUE, 'image/png', 'image.png')]),
+    # 与Note A相同的附件，只写入一次
+    _note('Note C', '<ul><li>one</li><li>two</li></ul>', [(RED, 'image/png', 'image.png')]),
+    # 重名笔记
+    _note('Note A', '<pre><code class="language-python">print(1)</code></pre>'),
+]
+
+ENEX = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export3.dtd">\n'
+    f"<en-export>{''.join(NOTES)}</en-export>"
+)
+
+def _read_tree(root: Path) -> dict:
+    """读取目录下所有文件的相对路径和内容"""
+    return {
+        path.relative_to(root).as_posix(): path.read_bytes()
+        for path in sorted(root.rglob('*')) if path.is_file()
+    }
+
+class RoundTripTest(unittest.TestCase):
+    """同一份ENEX分别串行和并行转换为Markdown，再转换回ENEX"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.tmp = Path(cls._tmp.name)
+        cls.source = cls.tmp / 'notes.enex'
+        cls.source.write_text(ENEX, encoding='utf-8')
+        
+        for workers in (1, 2):
+            md_dir = cls.tmp / f'md_{workers}'
+            Converter.enex_to_markdown(cls.source, md_dir, workers=workers)
+            Converter.markdown_to_enex(md_dir, cls.tmp / f'back_{workers}.enex', workers=workers)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+    
+    def test_markdown_serial_equals_parallel(self):
+        serial = _read_tree(self.tmp / 'md_1')
+        self.assertTrue(serial)
+        self.assertEqual(serial, _read_tree(self.tmp / 'md_2'))
+    
+    def test_enex_serial_equals_parallel(self):
+        self.assertEqual((self.tmp / 'back_1.enex').read_bytes(),
+                         (self.tmp / 'back_2.enex').read_bytes())
+    
+    def test_markdown_files(self):
+        tree = _read_tree(self.tmp / 'md_1')
+        self.assertEqual(
+            sorted(tree),
+            ['Note A.md', 'Note A_1.md', 'Note B.md', 'Note C.md',
+             'assets/doc.pdf', 'assets/image.png',
+             f'assets/image_{hashlib.md5(BLUE).hexdigest()[:8]}.png'],
+        )
+        self.assertEqual(tree['assets/image.png'], RED)
+        self.assertEqual(tree[f'assets/image_{hashlib.md5(BLUE).hexdigest()[:8]}.png'], BLUE)
+        self.assertIn('café', tree['Note A.md'].decode('utf-8'))
+    
+    def test_round_trip_keeps_notes_and_resources(self):
+        def summary(path: Path) -> list:
+            return sorted(
+                (note.title, note.tags, sorted(resource.data for resource in note.resources))
+                for note in EnexParser(path).parse()
+            )
+        
+        back = summary(self.tmp / 'back_1.enex')
+        self.assertEqual([title for title, _, _ in back], ['Note A', 'Note A', 'Note B', 'Note C'])
+        self.assertEqual(back, summary(self.source))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""表格转换的测试"""
+import unittest
+
+from lxml import html
+
+from converter.processors.table_handler import html_table_to_markdown, markdown_table_to_html
+
+SEPARATOR = '| --- | --- |'
+
+def to_markdown(table_html: str) -> str:
+    return html_table_to_markdown(html.fragment_fromstring(table_html))
+
+class SeparatorRowTest(unittest.TestCase):
+    """每个表格只有一个分隔符行，位于开头连续的表头行之后"""
+    
+    def test_two_row_thead(self):
+        markdown = to_markdown(
+            '<table><thead><tr><th>a</th><th>b</th></tr><tr><th>c</th><th>d</th></tr></thead>'
+            '<tbody><tr><td>1</td><td>2</td></tr></tbody></table>'
+        )
+        self.assertEqual(markdown, '| a | b |\n| c | d |\n' + SEPARATOR + '\n| 1 | 2 |\n')
+    
+    def test_two_row_thead_round_trip(self):
+        table = markdown_table_to_html(to_markdown(
+            '<table><thead><tr><th>a</th><th>b</th></tr><tr><th>c</th><th>d</th></tr></thead>'
+            '<tbody><tr><td>1</td><td>2</td></tr></tbody></table>'
+        ))
+        thead, tbody = html.fragment_fromstring(table)
+        self.assertEqual(len(thead), 2)
+        self.assertEqual(len(tbody), 1)
+    
+    def test_single_header_row(self):
+        markdown = to_markdown(
+            '<table><thead><tr><th>a</th><th>b</th></tr></thead>'
+            '<tbody><tr><td>1</td><td>2</td></tr><tr><td>3</td><td>4</td></tr></tbody></table>'
+        )
+        self.assertEqual(markdown.splitlines(), ['| a | b |', SEPARATOR, '| 1 | 2 |', '| 3 | 4 |'])
+    
+    def test_no_header_uses_first_row(self):
+        markdown = to_markdown('<table><tr><td>1</td><td>2</td></tr><tr><td>3</td><td>4</td></tr></table>')
+        self.assertEqual(markdown.splitlines(), ['| 1 | 2 |', SEPARATOR, '| 3 | 4 |'])
+    
+    def test_later_header_rows_get_no_separator(self):
+        markdown = to_markdown(
+            '<table><tr><td>1</td><td>2</td></tr>'
+            '<thead><tr><th>a</th><th>b</th></tr><tr><th>c</th><th>d</th></tr></thead></table>'
+        )
+        self.assertEqual(markdown.splitlines().count(SEPARATOR), 1)
+        self.assertEqual(markdown.splitlines()[1], SEPARATOR)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,45 @@
+import errno
 import os
 import shutil
 
+def iter_md_files(root, rel_path='.'):
+    """
+    按os.walk的顺序遍历目录中的Markdown文件，返回(相对目录, 文件名)
+    
+    直接使用scandir的目录项类型，不再逐个stat
+    """
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        return
+    
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            # 与os.walk一致，不进入符号链接指向的目录
+            if not entry.is_symlink():
+                subdirs.append(entry)
+        elif entry.name.endswith('.md'):
+            yield rel_path, entry.name
+    
+    for entry in subdirs:
+        yield from iter_md_files(entry.path, os.path.normpath(os.path.join(rel_path, entry.name)))
+
+def move_file(source_path, new_path):
+    """移动文件，同一文件系统内直接重命名（目标已存在时覆盖）"""
+    try:
+        os.replace(source_path, new_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 跨文件系统时复制后删除
+        shutil.move(source_path, new_path)
+
 def classify_files(source_dir, target_dir):
     """
     根据target_dir的目录结构来整理source_dir中的文件
@@ -9,28 +48,34 @@ def classify_files(source_dir, target_dir):
         source_dir: 源文件夹路径
         target_dir: 参考的目标文件夹路径
     """
+    # 一次列出源目录中的文件，之后只需查表
+    try:
+        with os.scandir(source_dir) as it:
+            source_names = {entry.name for entry in it}
+    except OSError:
+        return
+    created_dirs = set()
+    
     # 遍历目标目录结构
-    for root, dirs, files in os.walk(target_dir):
-        for filename in files:
-            if not filename.endswith('.md'):
-                continue
-                
-            # 获取源文件路径
-            source_path = os.path.join(source_dir, filename)
-            if not os.path.exists(source_path):
-                continue
-                
-            # 构建新的目标路径
-            rel_path = os.path.relpath(root, target_dir)
-            new_dir = os.path.join(source_dir, rel_path)
-            new_path = os.path.join(new_dir, filename)
-            
-            # 创建目标目录
+    for rel_path, filename in iter_md_files(target_dir):
+        if filename not in source_names:
+            continue
+        
+        # 构建新的目标路径
+        source_path = os.path.join(source_dir, filename)
+        new_dir = os.path.join(source_dir, rel_path)
+        new_path = os.path.join(new_dir, filename)
+        
+        # 创建目标目录
+        if new_dir not in created_dirs:
             os.makedirs(new_dir, exist_ok=True)
-            
-            # 移动文件
-            shutil.move(source_path, new_path)
-            print(f"已移动 {filename} 到 {new_path}")
+            created_dirs.add(new_dir)
+        
+        # 移动文件（目标在源目录顶层时文件原地不动，仍然可以被后续同名文件使用）
+        move_file(source_path, new_path)
+        if rel_path != '.':
+            source_names.discard(filename)
+        print(f"已移动 {filename} 到 {new_path}")
 
 if __name__ == '__main__':
     # 设置源目录和目标目录
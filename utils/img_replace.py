@@ -1,40 +1,163 @@
-import re
+import mmap
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+try:
+    import re2 as re  # 可选，基于DFA的正则引擎，匹配时不回溯
+except ImportError:
+    import re
+
+# 源文档中的图片: ![[path]]
+# 不使用捕获组，路径按匹配位置切片得到（去掉"![["和"]]"）
+_EXTRACT_RE = re.compile(r'!\[\[[^\]\n]*\]\]')
+# 目标文档中的图片: ![alt](path)
+# 使用排除字符类代替惰性匹配，不回溯；与原来一样不跨行，alt文本中不含"]"
+_REPLACE_PATTERN = r'!\[([^\]\n]*)\]\([^)\n]*\)'
+_REPLACE_RE = re.compile(_REPLACE_PATTERN)
+# 按字节匹配的版本，直接扫描映射到内存的目标文件，不解码
+_REPLACE_BYTES_RE = re.compile(_REPLACE_PATTERN.encode('ascii'))
+
+# 拼接替换后图片语法的固定片段: ![alt](path)
+_PREFIX = b'!['
+_MID = b']('
+_SUFFIX = b')'
 
 def extract_images(content):
-    """提取markdown文件中的图片路径"""
-    # pattern = r'!\[.*?\]\((.*?)\)'
-    pattern = r'!\[\[(.*?)\]\]'
-    return re.findall(pattern, content)
+    """按顺序逐个返回markdown文件中的图片路径（生成器，不构建列表）"""
+    return (content[match.start() + 3:match.end() - 2]
+            for match in _EXTRACT_RE.finditer(content))
+
+def _splice_images(text, source_images):
+    """用源图片迭代器中的路径依次替换文本中的图片路径"""
+    # 大多数行没有图片，先做字面量检查，不进入正则引擎
+    if '![' not in text:
+        return text
+    
+    # 逐个匹配并拼接片段，不为每个匹配调用替换函数
+    parts = []
+    pos = 0
+    for match in _REPLACE_RE.finditer(text):
+        source_image = next(source_images, None)
+        if source_image is None:
+            # 源图片已用完，其余内容保持不变
+            break
+        # 保持原始的alt文本，只替换图片路径
+        parts.append(text[pos:match.start()])
+        parts.append(f'![{match.group(1)}]({source_image})')
+        pos = match.end()
+    parts.append(text[pos:])
+    return ''.join(parts)
 
 def replace_images(source_content, target_content):
     """替换目标文档中的图片路径"""
-    source_images = extract_images(source_content)
-    
-    def replace_func(match):
-        if source_images:
-            # 保持原始的alt文本，只替换图片路径
-            return f'![{match.group(1)}]({source_images.pop(0)})'
-        return match.group(0)
-    
-    # 使用正则表达式替换图片路径
-    pattern = r'!\[(.*?)\]\(.*?\)'
-    return re.sub(pattern, replace_func, target_content)
+    # 源图片在替换时按需逐个提取
+    return _splice_images(target_content, extract_images(source_content))
 
-def main(source_file, target_file):
-    # 读取源文件
+def _splice_bytes(buf, source_images):
+    """在字节缓冲区中替换图片路径，返回替换后的内容"""
+    # 片段放入同一个列表，最后只拼接一次
+    parts = []
+    pos = 0
+    for match in _REPLACE_BYTES_RE.finditer(buf):
+        source_image = next(source_images, None)
+        if source_image is None:
+            # 源图片已用完，其余内容保持不变
+            break
+        # 保持原始的alt文本，只替换图片路径
+        parts.extend((buf[pos:match.start()],
+                      _PREFIX, match.group(1), _MID, source_image, _SUFFIX))
+        pos = match.end()
+    parts.append(buf[pos:])
+    return b''.join(parts)
+
+@lru_cache(maxsize=256)
+def _extract_from_file(source_file, mtime_ns, size):
+    """
+    读取源文件中的图片路径（编码为UTF-8，与目标文件的字节直接拼接）
+    
+    按文件路径、修改时间和大小缓存，同一源文件对应多个目标文件时只扫描一次
+    """
     with open(source_file, 'r', encoding='utf-8') as f:
         source_content = f.read()
+    return tuple(image.encode('utf-8') for image in extract_images(source_content))
+
+def _write_bytes(fd, data):
+    """不经过缓冲层，直接用os.write写入文件（一次写不完时继续写剩余部分）"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _copy_owner(source, target):
+    """复制文件的所有者和所属组（不支持或没有权限时保持不变）"""
+    if not hasattr(os, 'chown'):
+        return
+    st = os.stat(source)
+    try:
+        os.chown(target, st.st_uid, st.st_gid)
+    except PermissionError:
+        pass
+
+def main(source_file, target_file):
+    # 源文件未修改时直接使用缓存的图片路径
+    st = os.stat(source_file)
+    source_images = iter(_extract_from_file(source_file, st.st_mtime_ns, st.st_size))
     
-    # 读取目标文件
-    with open(target_file, 'r', encoding='utf-8') as f:
-        target_content = f.read()
+    # 目标文件映射到内存后按字节替换（UTF-8中多字节字符不含ASCII分隔符）
+    with open(target_file, 'rb') as fin:
+        # 空文件无法映射
+        if os.fstat(fin.fileno()).st_size:
+            with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                content = _splice_bytes(buf, source_images)
+        else:
+            content = b''
+    
+    # 目标文件是符号链接时更新其指向的文件，链接本身保持不变
+    real_target = os.path.realpath(target_file)
+    
+    # 在同一目录下新建唯一的临时文件（二进制模式，不会覆盖已有文件），
+    # 写入后复制原文件的权限和所有者，再替换原文件
+    fd, tmp_file = tempfile.mkstemp(
+        prefix=os.path.basename(real_target) + '.', suffix='.tmp',
+        dir=os.path.dirname(real_target))
+    try:
+        try:
+            _write_bytes(fd, content)
+        finally:
+            os.close(fd)
+        _copy_owner(real_target, tmp_file)
+        shutil.copymode(real_target, tmp_file)
+        
+        # 保存更新后的文件
+        os.replace(tmp_file, real_target)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def _process_pair(pair):
+    """处理一对文档（在子进程中执行）"""
+    main(*pair)
+
+def process_pairs(pairs, workers=None):
+    """
+    批量处理多对(源文档, 目标文档)
     
-    # 替换图片
-    new_content = replace_images(source_content, target_content)
+    各对文档相互独立，在进程池中并行处理，workers为1时在当前进程中串行执行
+    """
+    pairs = list(pairs)
+    if workers == 1 or len(pairs) <= 1:
+        for pair in pairs:
+            _process_pair(pair)
+        return
     
-    # 保存更新后的文件
-    with open(target_file, 'w', encoding='utf-8') as f:
-        f.write(new_content)
+    # 按文档对数分块，每个进程大约分到4块，文档较少时也能用上所有进程
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(pairs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_process_pair, pairs, chunksize=chunksize))
 
 if __name__ == '__main__':
     source_file = r'docA.md'  # A文档路径